@@ -0,0 +1,139 @@
+"""
+Semantic cache of final chat answers.
+A new question is served from cache when its query embedding is close enough (cosine)
+to one asked before in the same workspace and search type. Entries expire after a TTL,
+the cache is bounded by entry count (LRU), and a workspace's entries are dropped
+whenever its files change.
+
+Entries live in process memory, but the invalidations don't: every workspace has a
+generation token in a MetadataStore file shared by all worker processes. An upload
+or delete handled by one worker replaces the token, and the other workers discard
+their entries for that workspace on their next lookup.
+"""
+
+from collections import OrderedDict
+import itertools
+import threading
+import time
+import uuid
+import numpy as np
+import config as cfg
+from metadata_store import get_metadata_store
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+# Generation key of the answers to unscoped questions (workspace None)
+_ALL_WORKSPACES = "*"
+
+
+def _generation_key(workspace_name):
+    return _ALL_WORKSPACES if workspace_name is None else workspace_name
+
+
+class AnswerCache:
+    def __init__(self, max_entries, ttl_sec, similarity_threshold, generations_file=cfg.ANSWER_CACHE_GENERATIONS_FILE):
+        self.max_entries = max_entries
+        self.ttl_sec = ttl_sec
+        self.similarity_threshold = similarity_threshold
+        self._entries = OrderedDict()   # entry id -> (scope, unit embedding, answer, created_at, generation)
+        self._generations = get_metadata_store(generations_file)  # workspace -> token replaced on invalidation
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _unit(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def generation(self, workspace_name):
+        """Token for put(), an answer computed across an invalidation is then not stored"""
+        return self._generations.get(_generation_key(workspace_name), 0)
+
+    def lookup(self, query_embedding, workspace_name, search_type):
+        """Return the cached answer of the most similar earlier question, or None"""
+        query = self._unit(query_embedding)
+        scope = (workspace_name, search_type)
+        generation = self.generation(workspace_name)
+        now = time.monotonic()
+
+        with self._lock:
+            best_id, best_score = None, self.similarity_threshold
+            for entry_id, (entry_scope, embedding, _, created_at, entry_generation) in list(self._entries.items()):
+                if now - created_at > self.ttl_sec:
+                    del self._entries[entry_id]
+                    self.evictions += 1
+                    continue
+                if entry_scope != scope:
+                    continue
+                if entry_generation != generation:
+                    # The workspace changed since, possibly through another worker process
+                    del self._entries[entry_id]
+                    continue
+                score = float(np.dot(query, embedding))
+                if score >= best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_id)
+            self.hits += 1
+            logger.info(f"Answer cache hit for {scope} (similarity {best_score:.3f})")
+            return self._entries[best_id][2]
+
+    def put(self, query_embedding, workspace_name, search_type, answer, generation=None):
+        current = self.generation(workspace_name)
+        if generation is not None and generation != current:
+            # The workspace changed while this answer was being generated
+            return
+        with self._lock:
+            self._entries[next(self._ids)] = (
+                (workspace_name, search_type), self._unit(query_embedding), answer, time.monotonic(), current)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate_workspace(self, workspace_name):
+        """
+        Drop the answers of a workspace whose files changed.
+        Answers to unscoped questions (workspace None) searched every workspace, so they go too.
+        """
+        # A random token, not a counter: two workers invalidating at once can't both
+        # write the same next value and lose one of the invalidations
+        token = uuid.uuid4().hex
+        self._generations.update(items={key: token for key in {_generation_key(workspace_name), _ALL_WORKSPACES}})
+        with self._lock:
+            stale = [entry_id for entry_id, entry in self._entries.items()
+                     if entry[0][0] in (workspace_name, None)]
+            for entry_id in stale:
+                del self._entries[entry_id]
+            self.invalidations += 1
+        if stale:
+            logger.info(f"Invalidated {len(stale)} cached answers for workspace {workspace_name}")
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_sec": self.ttl_sec,
+                "similarity_threshold": self.similarity_threshold
+            }
+
+
+# Shared cache for the whole process
+answer_cache = AnswerCache(cfg.ANSWER_CACHE_MAX_ENTRIES, cfg.ANSWER_CACHE_TTL_SEC, cfg.ANSWER_CACHE_SIMILARITY)
@@ -2,7 +2,9 @@ import time
 from sumarizer import Summarizer
 from database import Database
 from vector_store import VectorStore
-from qa_chain import QAChain
+from context_cache import context_cache
+from answer_cache import answer_cache
+from qa_chain import QAChain, LLM_ERROR_ANSWER
 import json
 from image_viewer import ImageViewer
 import os
@@ -10,22 +12,35 @@ from gemini_direct import generate_image_title_dscrpt
 from collections import defaultdict
 from process_files import process_files,process_files_api
 import database 
+import config as cfg
+from relevance_grader import grade_contexts
+from pdf_extractor import ensure_page_image
+from reranker import CrossEncoderReranker, resolve_relevance_mode, LLM_RELEVANCE_THRESHOLD
+
+NO_CONTEXT_ANSWER = "No relevant information found in documents"
 
 def get_db():
     return database.Database()
 
-# here question type is either text or image
-def answer_question(question, search_type,workspace_name=None):
-    summarizer = Summarizer()
-    vs = VectorStore()
-    qa = QAChain()
-    viewer = ImageViewer()
+def _embed_question(question):
+    return Summarizer().generate_embeddings(question)
+
 
-    # Generate query embedding
-    query_embedding = summarizer.generate_embeddings(question)
+def _retrieve_contexts(qa, question, query_embedding, search_type, workspace_name=None, relevance_mode=None):
+    """
+    Retrieval half of answering a question: hybrid (or vector) search, context loading,
+    relevance filtering and TXT chunk regrouping.
+
+    Returns:
+        tuple: (contexts, sources) ready for QAChain
+    """
+    vs = VectorStore()
 
     # Query vector store with score threshold
-    if search_type == "text":
+    if cfg.HYBRID_SEARCH_ENABLED:
+        # Keyword hits fused with vector hits, exact tokens like invoice numbers are not missed
+        doc_ids = vs.hybrid_query(question, query_embedding, collection_type=search_type, workspace_name=workspace_name)
+    elif search_type == "text":
         if workspace_name:
             doc_ids = vs.filtered_query(query_embedding= query_embedding,filter_condition={"workspace_name": workspace_name}, collection_type="text")
         else:
@@ -40,6 +55,14 @@ def answer_question(question, search_type,workspace_name=None):
     contexts = []
     sources = []
     seen_docs = set()
+    candidates = []
+
+    # Resolve PDF/DOCX hits in one query, everything else is a Chroma-stored chunk
+    db = get_db()
+    try:
+        content_paths = db.get_content_paths(doc_ids)
+    finally:
+        db.conn.close()
 
     # Context collection phase
     for doc_id in doc_ids:
@@ -52,14 +75,12 @@ def answer_question(question, search_type,workspace_name=None):
             metadata = {}
             content_type = "text"
 
-            # Check SQL database first (PDF/DOCX)
-            db=get_db()
-            result=db.get_contentPath_fromDocument(doc_id)
+            # Check SQL results first (PDF/DOCX)
+            result = content_paths.get(doc_id)
 
             if result:  # Handle PDF/DOCX
                 json_path = result
-                with open(json_path, "r") as f:
-                    context = json.load(f)
+                context = context_cache.load(json_path)
                 metadata = context.get("metadata", {})
             else:  # Handle TXT/Image chunks
                 if search_type=="image":
@@ -83,30 +104,50 @@ def answer_question(question, search_type,workspace_name=None):
                     metadata = context["metadata"]
                     if metadata.get("document_type") == "image":
                         content_type = "image"
+                    elif metadata.get("page_image"):
+                        # PDF page chunk, only this page's image goes to the answer prompt
+                        context["images"] = {f"page_{metadata.get('page')}": metadata["page_image"]}
 
             if context:
-                # Context relevance validation
-                if content_type == "text":
-                    relevance = qa.validate_context_relevance(
-                        context, question)
-                    print(f"Relevance score for {doc_id}: {relevance:.2f}")
-                    if relevance > 0.7:
-                        contexts.append(context)
-                        sources.append(metadata.get("source", "Unknown"))
-                else:  # Always include images that pass score threshold
-                    relevance = qa.validate_context_relevance(
-                        context, question)
-                    print(f"Relevance score for {doc_id}: {relevance:.2f}")
-                    if relevance > 0.7:
-                        contexts.append(context)
-                        sources.append(metadata.get("original_path", "Unknown"))
+                candidates.append((doc_id, context, metadata, content_type))
 
         except Exception as e:
             print(f"Error processing {doc_id}: {str(e)}")
             continue
-        finally:
-            db.conn.close()
 
+    # Context relevance validation, either a local reranker batch or concurrent LLM grading
+    relevance_mode = resolve_relevance_mode(relevance_mode)
+    candidate_contexts = [candidate[1] for candidate in candidates]
+    if relevance_mode == "reranker":
+        reranker = CrossEncoderReranker()
+        scores = reranker.score(candidate_contexts, question)
+        threshold = reranker.threshold
+    else:
+        scores = grade_contexts(qa, candidate_contexts, question)
+        threshold = LLM_RELEVANCE_THRESHOLD
+    for (doc_id, context, metadata, content_type), relevance in zip(candidates, scores):
+        if relevance is None:
+            print(f"Relevance for {doc_id} unknown, grading missed the deadline")
+            if not cfg.RELEVANCE_INCLUDE_UNKNOWN:
+                continue
+        else:
+            print(f"Relevance score for {doc_id}: {relevance:.2f}")
+            if relevance <= threshold:
+                continue
+
+        contexts.append(context)
+        if content_type == "text":
+            sources.append(metadata.get("source", "Unknown"))
+        else:
+            sources.append(metadata.get("original_path", "Unknown"))
+
+
+    # Render cited PDF pages on demand, pages rendered before are cached on disk
+    for context in contexts:
+        metadata = context.get("metadata", {}) or {}
+        if metadata.get("page_image") and context.get("images"):
+            if not ensure_page_image(metadata.get("source"), metadata.get("page"), metadata["page_image"]):
+                context.pop("images", None)
 
     # Text chunk regrouping (existing functionality) , this is only for txt or md files
     chunk_groups = defaultdict(list)
@@ -128,9 +169,18 @@ def answer_question(question, search_type,workspace_name=None):
             sorted_chunks = sorted(chunks,
                                    key=lambda x: x["metadata"]["chunk"])
 
-            combined_text = "\n".join(
-                [chunk["text"]["content"] for chunk in sorted_chunks]
-            )
+            # Consecutive chunks overlap, drop the part the previous chunk already covered
+            parts, covered_until = [], None
+            for chunk in sorted_chunks:
+                content = chunk["text"]["content"]
+                start = chunk["metadata"].get("char_start")
+                if covered_until is not None and start is not None and start < covered_until:
+                    content = content[covered_until - start:]
+                if chunk["metadata"].get("char_end") is not None:
+                    covered_until = max(covered_until or 0, chunk["metadata"]["char_end"])
+                if content.strip():
+                    parts.append(content)
+            combined_text = "\n".join(parts)
             main_metadata = sorted_chunks[0]["metadata"]
             print("main_metadata::", main_metadata)
 
@@ -154,17 +204,30 @@ def answer_question(question, search_type,workspace_name=None):
         except Exception as e:
             print(f"Error processing chunks {base_id}: {e}")
 
+    return contexts, sources
+
+
+def _unique_sources(sources):
+    return list({os.path.basename(s) for s in sources if isinstance(s, str)})
+
+
+# here question type is either text or image
+def answer_question(question, search_type,workspace_name=None, relevance_mode=None):
+    query_embedding = _embed_question(question)
+
+    # Near-identical questions in the same workspace reuse the earlier answer
+    if cfg.ANSWER_CACHE_ENABLED:
+        cached = answer_cache.lookup(query_embedding, workspace_name, search_type)
+        if cached is not None:
+            return cached["answer"]
+        cache_generation = answer_cache.generation(workspace_name)
+
+    qa = QAChain()
+    contexts, sources = _retrieve_contexts(qa, question, query_embedding, search_type, workspace_name, relevance_mode)
+
     # Generate final answer
     if not contexts:
-        return "No relevant information found in documents"
-
-    # Prepare image results
-    image_references = []
-    for context in contexts:
-        if context.get("metadata", {}).get("document_type") == "image":
-            img_path = context["metadata"].get("source")
-            if img_path and os.path.exists(img_path):
-                image_references.append(img_path)
+        return NO_CONTEXT_ANSWER
 
     # Generate text answer
     if search_type == "text":
@@ -173,19 +236,84 @@ def answer_question(question, search_type,workspace_name=None):
         # print("provided context is ::")
         # print(contexts)
         answer = qa.generate_answer_image(contexts, question)
+    if answer == LLM_ERROR_ANSWER:
+        return answer
 
     # Add sources and image references
-    unique_sources = list({os.path.basename(s)
-                          for s in sources if isinstance(s, str)})
+    unique_sources = _unique_sources(sources)
     print(unique_sources)
     if unique_sources:
         answer += f"\n\nSources: {', '.join(unique_sources)}"
     print("Original sources::", sources)
 
+    if cfg.ANSWER_CACHE_ENABLED:
+        answer_cache.put(query_embedding, workspace_name, search_type,
+                         {"answer": answer, "sources": unique_sources}, cache_generation)
+
     print("Query processed successfully")
     return answer
 
 
+def stream_answer_events(question, search_type, workspace_name=None, relevance_mode=None):
+    """
+    Streaming counterpart of answer_question for the /chat/stream endpoint.
+    Yields (event, data) pairs: one "retrieval" event with the sources as soon as
+    the contexts are chosen, then "token" events with answer text as Gemini
+    generates it, then "done" (or "error").
+    """
+    retrieval_start = time.perf_counter()
+    query_embedding = _embed_question(question)
+
+    if cfg.ANSWER_CACHE_ENABLED:
+        cached = answer_cache.lookup(query_embedding, workspace_name, search_type)
+        if cached is not None:
+            yield "retrieval", {
+                "sources": cached["sources"],
+                "cached": True,
+                "retrieval_time_sec": round(time.perf_counter() - retrieval_start, 3)
+            }
+            yield "token", {"text": cached["answer"]}
+            yield "done", {"sources": cached["sources"]}
+            return
+        cache_generation = answer_cache.generation(workspace_name)
+
+    qa = QAChain()
+    contexts, sources = _retrieve_contexts(qa, question, query_embedding, search_type, workspace_name, relevance_mode)
+    unique_sources = _unique_sources(sources)
+    yield "retrieval", {
+        "sources": unique_sources,
+        "context_count": len(contexts),
+        "cached": False,
+        "retrieval_time_sec": round(time.perf_counter() - retrieval_start, 3)
+    }
+
+    if not contexts:
+        yield "token", {"text": NO_CONTEXT_ANSWER}
+        yield "done", {"sources": []}
+        return
+
+    answer_parts = []
+    try:
+        for text in qa.stream_answer(contexts, question, search_type):
+            answer_parts.append(text)
+            yield "token", {"text": text}
+    except Exception as e:
+        print(f"LLM Error: {str(e)}")
+        yield "error", {"message": LLM_ERROR_ANSWER}
+        return
+
+    # Same trailer the non-streaming answer ends with
+    if unique_sources:
+        trailer = f"\n\nSources: {', '.join(unique_sources)}"
+        answer_parts.append(trailer)
+        yield "token", {"text": trailer}
+
+    if cfg.ANSWER_CACHE_ENABLED:
+        answer_cache.put(query_embedding, workspace_name, search_type,
+                         {"answer": "".join(answer_parts), "sources": unique_sources}, cache_generation)
+    yield "done", {"sources": unique_sources}
+
+
 # Example Usage
 if __name__ == "__main__":
     start_time = time.time()
@@ -2,6 +2,7 @@ import time
 from sumarizer import Summarizer
 from database import Database
 from vector_store import VectorStore
+from context_cache import context_cache
 from qa_chain import QAChain
 import json
 from image_viewer import ImageViewer
@@ -39,6 +40,10 @@ def answer_question(question, search_type,workspace_name=None):
     image_sources = []
     seen_docs = set()
 
+    # Resolve PDF/DOCX hits in one query
+    content_paths = db.get_content_paths(doc_ids)
+    db.conn.close()
+
     # Context collection phase
     for doc_id in doc_ids:
         try:
@@ -50,17 +55,12 @@ def answer_question(question, search_type,workspace_name=None):
             metadata = {}
             content_type = "text"
 
-            # Check SQL database first (PDF/DOCX)
-            db.cursor.execute(
-                "SELECT content_path FROM documents WHERE doc_id=%s",
-                (doc_id,)
-            )
-            result = db.cursor.fetchone()
+            # Check SQL results first (PDF/DOCX)
+            result = content_paths.get(doc_id)
 
             if result:  # Handle PDF/DOCX
-                json_path = result[0]
-                with open(json_path, "r") as f:
-                    context = json.load(f)
+                json_path = result
+                context = context_cache.load(json_path)
                 metadata = context.get("metadata", {})
             else:  # Handle TXT/Image chunks
                 if search_type=="image":
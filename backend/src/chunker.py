@@ -0,0 +1,191 @@
+"""
+Boundary-respecting text chunker sized in embedding-model tokens.
+
+all-mpnet-base-v2 truncates its input at 384 tokens, so anything past that in a chunk
+is stored but never embedded. Chunks are therefore measured with the model's own
+tokenizer and cut on the coarsest boundary that fits: Markdown headings and fenced
+code blocks, blank lines, single lines, sentences and finally words. Consecutive
+chunks share up to `overlap_tokens` of whole units so context isn't lost at a cut.
+"""
+
+import re
+import threading
+import config as cfg
+from embedding_model import model_registry
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+CHARS_PER_TOKEN_ESTIMATE = 4
+# [CLS] and [SEP] count against the model limit
+SPECIAL_TOKENS = 2
+
+_HEADING_RE = re.compile(r"^#{1,6}\s+\S.*$", re.MULTILINE)
+_FENCE_RE = re.compile(r"^(```|~~~).*?^\1[^\n]*$", re.MULTILINE | re.DOTALL)
+_BLANK_LINE_RE = re.compile(r"\n[ \t]*\n")
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Fast tokenizers are not safe to call from several threads at once
+_tokenizer_lock = threading.Lock()
+
+
+def _spans(text, start, end, separator_re):
+    """Split text[start:end] on separator_re into non-blank (start, end) spans"""
+    spans, pos = [], start
+    for match in separator_re.finditer(text, start, end):
+        if text[pos:match.start()].strip():
+            spans.append((pos, match.start()))
+        pos = match.end()
+    if text[pos:end].strip():
+        spans.append((pos, end))
+    return spans
+
+
+class TextChunker:
+    def __init__(self, max_tokens=None, overlap_tokens=None, registry=None):
+        self.registry = registry or model_registry
+        self.max_tokens = max_tokens or cfg.CHUNK_MAX_TOKENS or self._model_limit()
+        self.overlap_tokens = cfg.CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+        self.overlap_tokens = min(self.overlap_tokens, self.max_tokens // 2)
+
+    def _model_limit(self):
+        try:
+            return self.registry.get_text_model().max_seq_length - SPECIAL_TOKENS
+        except Exception as e:
+            logger.warning(f"Could not read the embedding model limit, using 254 tokens: {e}")
+            return 254
+
+    def count_tokens(self, texts):
+        """Token count of each text, as the embedding model would see it"""
+        try:
+            tokenizer = self.registry.get_text_model().tokenizer
+            with _tokenizer_lock:
+                encoded = tokenizer(list(texts), add_special_tokens=False)["input_ids"]
+            return [len(ids) for ids in encoded]
+        except Exception as e:
+            logger.warning(f"Tokenizer unavailable, estimating token counts: {e}")
+            return [len(text) // CHARS_PER_TOKEN_ESTIMATE + 1 for text in texts]
+
+    def _blocks(self, text, markdown):
+        """
+        Top-level (start, end, starts_section) spans. In Markdown, headings start a
+        new section and fenced code blocks are never split on blank lines.
+        """
+        if not markdown:
+            return [(start, end, False) for start, end in _spans(text, 0, len(text), _BLANK_LINE_RE)]
+
+        fences = [(m.start(), m.end()) for m in _FENCE_RE.finditer(text)]
+        blocks, pos = [], 0
+        for fence_start, fence_end in fences + [(len(text), len(text))]:
+            for start, end in _spans(text, pos, fence_start, _BLANK_LINE_RE):
+                # A heading inside a paragraph still opens a new section
+                cuts = [m.start() for m in _HEADING_RE.finditer(text, start, end)]
+                bounds = sorted(set([start] + cuts + [end]))
+                for part_start, part_end in zip(bounds, bounds[1:]):
+                    if text[part_start:part_end].strip():
+                        blocks.append((part_start, part_end, part_start in cuts))
+            if fence_end > fence_start:
+                blocks.append((fence_start, fence_end, False))
+            pos = fence_end
+        return blocks
+
+    def _units(self, text, markdown):
+        """Spans small enough to embed whole, each (start, end, starts_section, tokens)"""
+        pending = self._blocks(text, markdown)
+        units = []
+        # Progressively finer separators for spans that are still too long
+        finer = [re.compile(r"\n"), _SENTENCE_END_RE, re.compile(r"\s+")]
+        level = {span[:2]: 0 for span in pending}
+
+        while pending:
+            counts = self.count_tokens([text[start:end] for start, end, _ in pending])
+            next_pending = []
+            for (start, end, section), tokens in zip(pending, counts):
+                depth = level.get((start, end), 0)
+                if tokens <= self.max_tokens:
+                    units.append((start, end, section, tokens))
+                    continue
+                if depth >= len(finer):
+                    if end - start <= 1:
+                        # Nothing left to cut, keep it rather than loop
+                        units.append((start, end, section, tokens))
+                        continue
+                    # A single huge "word" (CJK run, base64, hex dump), cut it by characters in
+                    # proportion to its measured token count. Every piece is strictly shorter than
+                    # the span, so repeated passes always terminate. Character cuts don't add up
+                    # token-wise when rejoined, so each piece is its own section.
+                    step = max(1, (end - start) * self.max_tokens // tokens)
+                    for part_start in range(start, end, step):
+                        part = (part_start, min(part_start + step, end))
+                        level[part] = depth
+                        next_pending.append((*part, True))
+                    continue
+                parts = _spans(text, start, end, finer[depth])
+                if len(parts) <= 1:
+                    level[(start, end)] = depth + 1
+                    next_pending.append((start, end, section))
+                    continue
+                for idx, (part_start, part_end) in enumerate(parts):
+                    level[(part_start, part_end)] = depth + 1
+                    next_pending.append((part_start, part_end, section and idx == 0))
+            pending = next_pending
+
+        return sorted(units)
+
+    def split_text(self, text, markdown=False):
+        """
+        Split text into chunks of at most max_tokens embedding tokens.
+
+        Returns:
+            list[dict]: {"text", "start", "end", "tokens"} per chunk, where start/end
+            are character offsets into `text` (chunks overlap when overlap_tokens > 0)
+        """
+        if not text or not text.strip():
+            return []
+        units = self._units(text, markdown)
+        chunks = []
+        current = []  # units of the chunk being built
+
+        def current_tokens():
+            # Units are cut on whitespace, which the wordpiece tokenizer drops, so counts add up
+            return sum(unit[3] for unit in current)
+
+        def emit():
+            start, end = current[0][0], current[-1][1]
+            chunks.append({"text": text[start:end], "start": start, "end": end, "tokens": current_tokens()})
+
+        new_units = 0  # units in `current` that aren't overlap from the previous chunk
+        for unit in units:
+            starts_section = unit[2] and new_units > 0
+            if current and (starts_section or current_tokens() + unit[3] > self.max_tokens):
+                if new_units:
+                    emit()
+                # Carry whole trailing units over as overlap, never across a section start
+                carry, carry_tokens = [], 0
+                if not unit[2]:
+                    for previous in reversed(current):
+                        if carry_tokens + previous[3] > self.overlap_tokens:
+                            break
+                        carry.insert(0, previous)
+                        carry_tokens += previous[3]
+                if carry_tokens + unit[3] > self.max_tokens:
+                    carry = []
+                current, new_units = carry, 0
+            current.append(unit)
+            new_units += 1
+        if current and new_units:
+            emit()
+        return chunks
+
+
+_default_chunker = None
+_default_chunker_lock = threading.Lock()
+
+
+def get_chunker():
+    """Process-wide chunker with the configured limits"""
+    global _default_chunker
+    with _default_chunker_lock:
+        if _default_chunker is None:
+            _default_chunker = TextChunker()
+        return _default_chunker
@@ -11,6 +11,7 @@ BASE_URL=os.environ.get("BASE_URL","http://localhost/api/") # Update this to you
 IMAGES_METADATA_FILE = os.path.join(BASE_DIR, "media", "files-metadata", "images_metadata.json")
 IMAGE_STORAGE_DIR = os.path.join(BASE_DIR, "media", "images")
 CHROMA_DATA_DIR = os.path.join(BASE_DIR, "media", "chroma-data")
+# Legacy uploaded-file list, only read once to seed the file_registry table
 ALL_FILES_LIST = os.path.join(BASE_DIR, "media", "all_files_list.json")
 DOCS_METADATA_FILE = os.path.join(BASE_DIR, "media", "files-metadata", "docs_metadata.json")
 OUTPUT_DIR = os.path.join(BASE_DIR, "media", "output")
@@ -22,4 +23,66 @@ ALLWOED_EXTENSIONS = [".docx", ".doc", ".pdf", ".txt", ".json", ".jpg", ".png",
 ALLWOED_IMAGE_EXTENSIONS=[".png",".jpg","jpeg"]  # here not putting .webp because .webp will converted to .png in end for process
 LOGS_FILE=os.path.join(BASE_DIR, "logs")
 
-FRONTEND_ORIGINS=os.environ.get("FRONTEND_ORIGINS", "http://localhost:5173")  # Default to localhost if not set
\ No newline at end of file
+FRONTEND_ORIGINS=os.environ.get("FRONTEND_ORIGINS", "http://localhost:5173")  # Default to localhost if not set
+
+TEXT_EMBEDDING_BATCH_SIZE = int(os.environ.get("TEXT_EMBEDDING_BATCH_SIZE", 32))  # chunks per SentenceTransformer forward pass
+CHROMA_ADD_BATCH_SIZE = int(os.environ.get("CHROMA_ADD_BATCH_SIZE", 256))  # rows per collection.add in VectorStore.add_many
+
+GEMINI_RPM = int(os.environ.get("GEMINI_RPM", 50))  # Gemini requests per minute shared by the whole process
+GEMINI_TPM = int(os.environ.get("GEMINI_TPM", 1000000))  # Gemini input+output tokens per minute, 0 to disable
+GEMINI_BURST = int(os.environ.get("GEMINI_BURST", 5))  # requests allowed back to back before RPM pacing applies
+GEMINI_OUTPUT_TOKEN_ESTIMATE = int(os.environ.get("GEMINI_OUTPUT_TOKEN_ESTIMATE", 1024))  # output tokens reserved per call
+GEMINI_RATE_LIMIT_COOLDOWN_SEC = float(os.environ.get("GEMINI_RATE_LIMIT_COOLDOWN_SEC", 20))  # pause after a 429
+GEMINI_LIMITER_STATE_FILE = os.environ.get("GEMINI_LIMITER_STATE_FILE") or None  # share the bucket across processes (POSIX only)
+RELEVANCE_MAX_WORKERS = int(os.environ.get("RELEVANCE_MAX_WORKERS", 5))  # concurrent relevance grading calls per request
+RELEVANCE_DEADLINE_SEC = float(os.environ.get("RELEVANCE_DEADLINE_SEC", 15))  # per-request budget for relevance grading
+RELEVANCE_INCLUDE_UNKNOWN = os.environ.get("RELEVANCE_INCLUDE_UNKNOWN", "true").lower() == "true"  # keep contexts whose grading missed the deadline
+
+RELEVANCE_MODE = os.environ.get("RELEVANCE_MODE", "llm")  # "llm" (Gemini grading) or "reranker" (local cross-encoder)
+RERANKER_MODEL_NAME = os.environ.get("RERANKER_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANKER_THRESHOLD = float(os.environ.get("RERANKER_THRESHOLD", 0.5))  # sigmoid score a context must exceed to be kept
+RERANKER_BATCH_SIZE = int(os.environ.get("RERANKER_BATCH_SIZE", 16))
+
+CONTEXT_CACHE_MAX_BYTES = int(os.environ.get("CONTEXT_CACHE_MAX_MB", 128)) * 1024 * 1024  # parsed extracted_data.json kept in memory
+
+SUMMARIZE_DOCUMENTS = os.environ.get("SUMMARIZE_DOCUMENTS", "true").lower() == "true"  # index a background summary vector per PDF/DOCX
+SUMMARY_MAX_WORKERS = int(os.environ.get("SUMMARY_MAX_WORKERS", 2))
+SUMMARY_MAP_WORKERS = int(os.environ.get("SUMMARY_MAP_WORKERS", 4))  # concurrent map calls across all summaries
+SUMMARY_MAP_CHUNK_TOKENS = int(os.environ.get("SUMMARY_MAP_CHUNK_TOKENS", 30000))  # estimated Gemini tokens per map call
+SUMMARY_MAX_WORDS = int(os.environ.get("SUMMARY_MAX_WORDS", 250))  # length of the final summary, it is embedded as one vector
+SUMMARY_CACHE_DIR = os.path.join(BASE_DIR, "media", "summary-cache")  # summaries by content hash, kept across deletes
+
+INGESTION_WORKERS = int(os.environ.get("INGESTION_WORKERS", 2))  # background workers for /process_file/process jobs
+ASYNC_INGESTION = os.environ.get("ASYNC_INGESTION", "true").lower() == "true"  # /process_file/process returns a job id unless the body sets "async": false
+INGESTION_HEARTBEAT_SEC = float(os.environ.get("INGESTION_HEARTBEAT_SEC", 15))  # how often a worker process marks its jobs alive
+INGESTION_JOB_STALE_SEC = int(os.environ.get("INGESTION_JOB_STALE_SEC", 90))  # jobs without a heartbeat this long belong to a dead process
+
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", min(4, os.cpu_count() or 1)))  # processes for page-parallel PDF text/OCR, 1 disables
+PDF_PARALLEL_MIN_PAGES = int(os.environ.get("PDF_PARALLEL_MIN_PAGES", 8))  # smaller PDFs are extracted in-process
+EXTRACT_TABLES = os.environ.get("EXTRACT_TABLES", "true").lower() == "true"  # table extraction for PDF/DOCX ingestion
+CAMELOT_PAGES_PER_BATCH = int(os.environ.get("CAMELOT_PAGES_PER_BATCH", 20))  # pages per camelot.read_pdf call
+
+PDF_RENDER_MODE = os.environ.get("PDF_RENDER_MODE", "lazy")  # "lazy" renders a page image when retrieval cites it, "eager" renders all at ingest
+PDF_RENDER_BATCH_PAGES = int(os.environ.get("PDF_RENDER_BATCH_PAGES", 4))  # pages rasterized per pdf2image call in eager mode
+
+CONTENT_STORE_DIR = os.path.join(BASE_DIR, "media", "content-store")  # ingestion artifacts keyed by file SHA-256
+CONTENT_DEDUP = os.environ.get("CONTENT_DEDUP", "true").lower() == "true"  # reuse artifacts for byte-identical uploads
+
+METADATA_LOG_COMPACT_ENTRIES = int(os.environ.get("METADATA_LOG_COMPACT_ENTRIES", 1000))  # WAL records before folding into the metadata JSON snapshot
+LEXICAL_INDEX_COMPACT_BYTES = int(os.environ.get("LEXICAL_INDEX_COMPACT_BYTES", 64 * 1024 * 1024))  # BM25 log size before it is folded in, also never below the snapshot size
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"  # serve repeated questions from the semantic answer cache
+ANSWER_CACHE_SIMILARITY = float(os.environ.get("ANSWER_CACHE_SIMILARITY", 0.95))  # min cosine similarity of query embeddings for a hit
+ANSWER_CACHE_TTL_SEC = int(os.environ.get("ANSWER_CACHE_TTL_SEC", 3600))
+ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 500))
+ANSWER_CACHE_GENERATIONS_FILE = os.path.join(BASE_DIR, "media", "answer-cache", "generations.json")  # workspace invalidations shared by all worker processes
+
+CHUNK_MAX_TOKENS = int(os.environ.get("CHUNK_MAX_TOKENS", 0))  # embedding tokens per chunk, 0 = the embedding model's limit
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", 48))  # whole sentences/lines repeated between consecutive chunks
+
+HYBRID_SEARCH_ENABLED = os.environ.get("HYBRID_SEARCH_ENABLED", "true").lower() == "true"  # fuse BM25 keyword hits with vector hits
+HYBRID_CANDIDATES = int(os.environ.get("HYBRID_CANDIDATES", 20))  # hits taken from each retriever before fusion
+HYBRID_RRF_K = int(os.environ.get("HYBRID_RRF_K", 60))  # reciprocal rank fusion constant
+LEXICAL_INDEX_DIR = os.path.join(BASE_DIR, "media", "lexical-index")
+BM25_K1 = float(os.environ.get("BM25_K1", 1.5))
+BM25_B = float(os.environ.get("BM25_B", 0.75))
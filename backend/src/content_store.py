@@ -0,0 +1,118 @@
+"""
+Content-addressed store of ingestion artifacts, keyed by the SHA-256 of the file bytes.
+Keeps the extraction output, chunk texts and chunk embeddings, so the same file
+uploaded again (under any name, in any workspace) is linked instead of being
+re-OCRed and re-embedded. Entries are reference counted and removed when the last
+document using them is deleted. Summaries are cached separately by the Summarizer.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import numpy as np
+import config as cfg
+import database
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_db():
+    return database.Database()
+
+
+def file_sha256(file_path, block_size=1024 * 1024):
+    """SHA-256 hex digest of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class ContentStore:
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def _entry_dir(self, content_hash):
+        return os.path.join(self.root_dir, content_hash[:2], content_hash)
+
+    def acquire(self, content_hash):
+        """
+        Take a reference on the stored artifacts of content_hash and return them, or None
+        if there is no complete entry. The reference is taken before the files are read,
+        so a concurrent delete can't remove them underneath us. The caller owns it and must
+        release() it if the document is not ingested after all.
+
+        Returns:
+            dict: content_hash, data (extracted_data), chunk_texts, embeddings (np.ndarray)
+        """
+        with get_db() as db:
+            if not db.acquire_content_ref(content_hash):
+                return None
+
+        entry_dir = self._entry_dir(content_hash)
+        try:
+            with open(os.path.join(entry_dir, "extracted_data.json"), "r") as f:
+                data = json.load(f)
+            with open(os.path.join(entry_dir, "chunks.json"), "r") as f:
+                chunk_texts = json.load(f)
+            embeddings = np.load(os.path.join(entry_dir, "embeddings.npy"))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Content store entry {content_hash} is incomplete, ignoring it: {e}")
+            self.release(content_hash)
+            return None
+
+        return {
+            "content_hash": content_hash,
+            "data": data,
+            "chunk_texts": chunk_texts,
+            "embeddings": embeddings
+        }
+
+    def save(self, content_hash, ext, data, chunk_texts, embeddings, data_path=None, take_ref=True):
+        """
+        Store the artifacts of a freshly ingested file and take the first reference.
+        If the extraction was already written to data_path it is copied instead of re-serialized.
+        take_ref=False refreshes the artifacts of an entry the caller already holds a reference on.
+        """
+        entry_dir = self._entry_dir(content_hash)
+        os.makedirs(entry_dir, exist_ok=True)
+        if data_path:
+            tmp_path = os.path.join(entry_dir, "extracted_data.json.tmp")
+            shutil.copyfile(data_path, tmp_path)
+            os.replace(tmp_path, os.path.join(entry_dir, "extracted_data.json"))
+        else:
+            _atomic_write_json(os.path.join(entry_dir, "extracted_data.json"), data)
+        _atomic_write_json(os.path.join(entry_dir, "chunks.json"), list(chunk_texts))
+        tmp_path = os.path.join(entry_dir, "embeddings.tmp.npy")
+        np.save(tmp_path, np.asarray(embeddings, dtype=np.float32))
+        os.replace(tmp_path, os.path.join(entry_dir, "embeddings.npy"))
+
+        # The row is written last, it marks the entry as complete
+        if take_ref:
+            with get_db() as db:
+                db.add_content_ref(content_hash, ext)
+        logger.info(f"Stored content artifacts for {content_hash}")
+
+    def release(self, content_hash):
+        """Drop one reference, removing the artifacts when none are left"""
+        if not content_hash:
+            return
+        with get_db() as db:
+            remaining = db.release_content_ref(content_hash)
+        if remaining is not None and remaining <= 0:
+            shutil.rmtree(self._entry_dir(content_hash), ignore_errors=True)
+            logger.info(f"Removed content artifacts for {content_hash}, no references left")
+
+
+# Shared store for the whole process
+content_store = ContentStore(cfg.CONTENT_STORE_DIR)
@@ -0,0 +1,94 @@
+"""
+In-memory LRU cache of parsed extracted_data.json contexts.
+Entries are keyed by (path, mtime) so a re-extracted file is never served stale,
+and the cache is bounded by bytes (file size on disk) rather than by entry count.
+"""
+
+from collections import OrderedDict
+import json
+import os
+import threading
+import config as cfg
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+
+class ContextCache:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (path, mtime) -> (context, size)
+        self._current_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def load(self, json_path):
+        """
+        Return the parsed JSON at json_path, from cache when the file is unchanged.
+        The returned dict is shared between callers, treat it as read-only.
+        """
+        stat = os.stat(json_path)
+        key = (os.path.abspath(json_path), stat.st_mtime_ns)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        # Parse outside the lock so other readers aren't blocked on a large file
+        with open(json_path, "r") as f:
+            context = json.load(f)
+
+        self._put(key, context, stat.st_size)
+        return context
+
+    def _put(self, key, context, size):
+        if size > self.max_bytes:
+            # Never cache something that would evict everything else
+            return
+        with self._lock:
+            if key in self._entries:
+                return
+            # Drop older versions of the same file
+            for old_key in [k for k in self._entries if k[0] == key[0]]:
+                self._current_bytes -= self._entries.pop(old_key)[1]
+
+            self._entries[key] = (context, size)
+            self._current_bytes += size
+            while self._current_bytes > self.max_bytes:
+                old_key, (_, old_size) = self._entries.popitem(last=False)
+                self._current_bytes -= old_size
+                self.evictions += 1
+                logger.debug(f"Evicted context cache entry {old_key[0]}")
+
+    def invalidate(self, json_path):
+        """Drop every cached version of json_path"""
+        path = os.path.abspath(json_path)
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == path]:
+                self._current_bytes -= self._entries.pop(key)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._current_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._current_bytes,
+                "max_bytes": self.max_bytes
+            }
+
+
+# Shared cache for the whole process
+context_cache = ContextCache(cfg.CONTEXT_CACHE_MAX_BYTES)
@@ -1,6 +1,9 @@
 import mysql.connector
 from dotenv import load_dotenv
 import os
+import json
+import config as cfg
+import threading
 from mysql.connector.pooling import MySQLConnectionPool
 
 load_dotenv()
@@ -17,11 +20,226 @@ pool = MySQLConnectionPool(
     autocommit=True                # Ensure autocommit is on
 )
 
+def _import_all_files_list(cursor):
+    """One-time copy of the legacy all_files_list.json into file_registry"""
+    if not os.path.exists(cfg.ALL_FILES_LIST):
+        return
+    try:
+        with open(cfg.ALL_FILES_LIST, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Skipping import of {cfg.ALL_FILES_LIST}: {str(e)}")
+        return
+    for entry in entries:
+        cursor.execute("""
+            INSERT IGNORE INTO file_registry (workspace_name, file_name, file_path, doc_type, added_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (entry.get("workspace_name") or "", os.path.basename(entry["file_path"]),
+              entry["file_path"], entry.get("doc_type"), entry.get("added_at")))
+    print(f"Imported {len(entries)} entries from {cfg.ALL_FILES_LIST}")
+
+
+# Versioned schema migrations, applied once at startup by ensure_schema().
+# Append new (version, [statements]) entries, never edit an applied one.
+# A statement is either SQL or a callable taking the cursor, for data migrations.
+SCHEMA_MIGRATIONS = [
+    (1, [
+        """
+        CREATE TABLE IF NOT EXISTS documents (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            doc_id VARCHAR(255) UNIQUE,
+            title VARCHAR(255),
+            workspace_name VARCHAR(255),
+            timestamp VARCHAR(255),
+            content_path TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS workspace_manager (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id VARCHAR(255),
+            workspace_name VARCHAR(255) UNIQUE,
+            total_files INT DEFAULT 0,
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS workspace_files (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            workspace_id INT,
+            file_name VARCHAR(255),
+            file_path VARCHAR(255),
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (workspace_id) REFERENCES workspace_manager(id) ON DELETE CASCADE
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS workspace_files_docID (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            workspace_id INT,
+            file_id INT,
+            doc_id VARCHAR(255),
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (workspace_id) REFERENCES workspace_manager(id) ON DELETE CASCADE,
+            FOREIGN KEY (file_id) REFERENCES workspace_files(id) ON DELETE CASCADE
+        )
+        """,
+        # Create trigger for file insertion
+        """
+        DROP TRIGGER IF EXISTS after_workspace_file_insert
+        """,
+        """
+        CREATE TRIGGER after_workspace_file_insert
+        AFTER INSERT ON workspace_files
+        FOR EACH ROW
+        BEGIN
+            UPDATE workspace_manager 
+            SET 
+                total_files = total_files + 1,
+                last_modified = CURRENT_TIMESTAMP
+            WHERE id = NEW.workspace_id;
+        END
+        """,
+        # Create trigger for file deletion
+        """
+        DROP TRIGGER IF EXISTS after_workspace_file_delete
+        """,
+        """
+        CREATE TRIGGER after_workspace_file_delete
+        AFTER DELETE ON workspace_files
+        FOR EACH ROW
+        BEGIN
+            UPDATE workspace_manager 
+            SET 
+                total_files = total_files - 1,
+                last_modified = CURRENT_TIMESTAMP
+            WHERE id = OLD.workspace_id;
+        END
+        """,
+    ]),
+    (2, [
+        """
+        CREATE TABLE IF NOT EXISTS ingestion_jobs (
+            job_id VARCHAR(64) PRIMARY KEY,
+            status VARCHAR(32) NOT NULL,
+            stage VARCHAR(64),
+            stages TEXT,
+            payload TEXT,
+            result MEDIUMTEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_ingestion_jobs_status (status)
+        )
+        """,
+    ]),
+    (3, [
+        """
+        CREATE TABLE IF NOT EXISTS content_store (
+            content_hash CHAR(64) PRIMARY KEY,
+            file_ext VARCHAR(16),
+            ref_count INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+    ]),
+    (4, [
+        """
+        CREATE TABLE IF NOT EXISTS file_registry (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            workspace_name VARCHAR(255) NOT NULL DEFAULT '',
+            file_name VARCHAR(255) NOT NULL,
+            file_path TEXT,
+            doc_type VARCHAR(16),
+            added_at VARCHAR(64),
+            UNIQUE KEY uq_file_registry_workspace_file (workspace_name, file_name)
+        )
+        """,
+        _import_all_files_list,
+    ]),
+    (5, [
+        # The process running a job refreshes heartbeat_at, a job is only taken over once it goes stale
+        """
+        ALTER TABLE ingestion_jobs
+            ADD COLUMN owner VARCHAR(128) NULL,
+            ADD COLUMN heartbeat_at TIMESTAMP NULL
+        """,
+    ]),
+]
+
+
+_schema_lock = threading.Lock()
+_schema_ready = False
+
+
+def run_migrations():
+    """
+    Apply pending schema migrations and record each applied version in schema_version.
+    A MySQL named lock keeps several worker processes from migrating at the same time.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    conn = pool.get_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT GET_LOCK('schema_migrations', 60) AS acquired")
+        if not cursor.fetchone()["acquired"]:
+            raise RuntimeError("Timed out waiting for the schema migration lock")
+        try:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INT PRIMARY KEY,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+            current_version = cursor.fetchone()["version"]
+
+            for version, statements in SCHEMA_MIGRATIONS:
+                if version <= current_version:
+                    continue
+                print(f"Applying schema migration {version}")
+                for statement in statements:
+                    # Data migrations are callables that receive the cursor
+                    if callable(statement):
+                        statement(cursor)
+                    else:
+                        cursor.execute(statement)
+                cursor.execute("INSERT INTO schema_version (version) VALUES (%s)", (version,))
+                conn.commit()
+                current_version = version
+
+            return current_version
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migrations') AS released")
+            cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def ensure_schema():
+    """Run the migrations once per process, later calls are a no-op"""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            version = run_migrations()
+            print(f"Database schema at version {version}")
+            _schema_ready = True
+
+
 class Database:
     def __init__(self):
+        # Schema is migrated once per process, after that this is only a pool checkout
+        ensure_schema()
         self.conn = pool.get_connection()
         self.cursor = self.conn.cursor(dictionary=True)
-        self._create_tables()
     
     def __enter__(self):
         return self
@@ -30,92 +248,6 @@ class Database:
         if self.conn:
             self.conn.close()
 
-    def _create_tables(self):
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                doc_id VARCHAR(255) UNIQUE,
-                title VARCHAR(255),
-                workspace_name VARCHAR(255),
-                timestamp VARCHAR(255),
-                content_path TEXT
-            )
-        """)
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS workspace_manager (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id VARCHAR(255),
-                workspace_name VARCHAR(255) UNIQUE,
-                total_files INT DEFAULT 0,
-                last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS workspace_files (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                workspace_id INT,
-                file_name VARCHAR(255),
-                file_path VARCHAR(255),
-                last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (workspace_id) REFERENCES workspace_manager(id) ON DELETE CASCADE
-            )
-        """)
-
-        self.cursor.execute("""
-            CREATE TABLE IF NOT EXISTS workspace_files_docID (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                workspace_id INT,
-                file_id INT,
-                doc_id VARCHAR(255),
-                last_modified TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (workspace_id) REFERENCES workspace_manager(id) ON DELETE CASCADE,
-                FOREIGN KEY (file_id) REFERENCES workspace_files(id) ON DELETE CASCADE
-            )
-        """)
-
-        # Create trigger for file insertion
-        self.cursor.execute("""
-            DROP TRIGGER IF EXISTS after_workspace_file_insert
-        """)
-
-        self.cursor.execute("""
-            CREATE TRIGGER after_workspace_file_insert
-            AFTER INSERT ON workspace_files
-            FOR EACH ROW
-            BEGIN
-                UPDATE workspace_manager 
-                SET 
-                    total_files = total_files + 1,
-                    last_modified = CURRENT_TIMESTAMP
-                WHERE id = NEW.workspace_id;
-            END
-        """)
-
-        # Create trigger for file deletion
-        self.cursor.execute("""
-            DROP TRIGGER IF EXISTS after_workspace_file_delete
-        """)
-
-        self.cursor.execute("""
-            CREATE TRIGGER after_workspace_file_delete
-            AFTER DELETE ON workspace_files
-            FOR EACH ROW
-            BEGIN
-                UPDATE workspace_manager 
-                SET 
-                    total_files = total_files - 1,
-                    last_modified = CURRENT_TIMESTAMP
-                WHERE id = OLD.workspace_id;
-            END
-        """)
-
-        self.conn.commit()
-
     def insert_document(self, doc_id, title,workspace_name, timestamp, content_path):
         query = """
             INSERT INTO documents (doc_id, title,workspace_name, timestamp, content_path)
@@ -150,6 +282,31 @@ class Database:
             print(f"Type of doc_id: {type(doc_id)}, Value: {doc_id}")
             return None
 
+    def get_content_paths(self, doc_ids):
+        """
+        Resolve content paths for many doc_ids in a single query.
+        Uses the UNIQUE index on documents.doc_id, so the IN lookup is index-backed.
+
+        Args:
+            doc_ids (list): Document IDs, e.g. the hits of a vector search
+
+        Returns:
+            dict: doc_id -> content_path, only for the doc_ids found (PDF/DOCX)
+        """
+        doc_ids = list(dict.fromkeys(doc_id for doc_id in doc_ids if doc_id))
+        if not doc_ids:
+            return {}
+        try:
+            placeholders = ", ".join(["%s"] * len(doc_ids))
+            self.cursor.execute(
+                f"SELECT doc_id, content_path FROM documents WHERE doc_id IN ({placeholders})",
+                tuple(doc_ids)
+            )
+            return {row['doc_id']: row['content_path'] for row in self.cursor.fetchall()}
+        except Exception as e:
+            print(f"Database error in get_content_paths: {str(e)}")
+            return {}
+
     def delete_doc(self, doc_id):
         """
         Delete a document from the database by its doc_id.
@@ -473,6 +630,212 @@ class Database:
         self.conn.commit()
         return self.cursor.rowcount
 
+    def create_ingestion_job(self, job_id, payload, owner=None):
+        """Insert a queued ingestion job owned by a worker process, payload is a JSON-serializable dict"""
+        self.cursor.execute("""
+            INSERT INTO ingestion_jobs (job_id, status, stage, stages, payload, owner, heartbeat_at)
+            VALUES (%s, 'queued', 'queued', %s, %s, %s, NOW())
+        """, (job_id, json.dumps([]), json.dumps(payload), owner))
+        self.conn.commit()
+
+    def heartbeat_ingestion_jobs(self, owner):
+        """Mark the unfinished jobs of a worker process as still alive"""
+        self.cursor.execute("""
+            UPDATE ingestion_jobs SET heartbeat_at = NOW()
+            WHERE owner = %s AND status IN ('queued', 'running')
+        """, (owner,))
+        self.conn.commit()
+        return self.cursor.rowcount
+
+    def update_ingestion_job(self, job_id, status=None, stage=None, stages=None, result=None):
+        """Update the given fields of an ingestion job"""
+        fields = []
+        params = []
+        if status is not None:
+            fields.append("status = %s")
+            params.append(status)
+        if stage is not None:
+            fields.append("stage = %s")
+            params.append(stage)
+        if stages is not None:
+            fields.append("stages = %s")
+            params.append(json.dumps(stages))
+        if result is not None:
+            fields.append("result = %s")
+            params.append(json.dumps(result, default=str))
+        if not fields:
+            return 0
+        params.append(job_id)
+        self.cursor.execute(
+            f"UPDATE ingestion_jobs SET {', '.join(fields)} WHERE job_id = %s",
+            tuple(params)
+        )
+        self.conn.commit()
+        return self.cursor.rowcount
+
+    def get_ingestion_job(self, job_id):
+        """Get an ingestion job with its JSON columns decoded, or None"""
+        try:
+            self.cursor.execute("""
+                SELECT job_id, status, stage, stages, payload, result, created_at, updated_at
+                FROM ingestion_jobs
+                WHERE job_id = %s
+            """, (job_id,))
+            result = self.cursor.fetchone()
+            if not result:
+                return None
+            return self._decode_ingestion_job(result)
+        except Exception as e:
+            print(f"Database error in get_ingestion_job: {str(e)}")
+            return None
+
+    def get_stale_ingestion_jobs(self, statuses, stale_sec):
+        """
+        Get unfinished jobs whose owner stopped sending heartbeats for stale_sec seconds,
+        oldest first. Jobs from before owners were recorded have no heartbeat and count as stale.
+        """
+        placeholders = ", ".join(["%s"] * len(statuses))
+        self.cursor.execute(f"""
+            SELECT job_id, status, stage, stages, payload, result, created_at, updated_at, owner
+            FROM ingestion_jobs
+            WHERE status IN ({placeholders})
+              AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)
+            ORDER BY created_at
+        """, tuple(statuses) + (stale_sec,))
+        return [self._decode_ingestion_job(row) for row in self.cursor.fetchall()]
+
+    def take_over_stale_ingestion_job(self, job_id, status, owner, stale_sec, new_status=None, result=None):
+        """
+        Atomically take a stale job over: it must still be in `status` and still be stale,
+        so of several processes recovering at once only one succeeds.
+
+        Returns:
+            bool: True if this caller now owns the job
+        """
+        fields = ["owner = %s", "heartbeat_at = NOW()"]
+        params = [owner]
+        if new_status is not None:
+            fields.append("status = %s")
+            params.append(new_status)
+        if result is not None:
+            fields.append("result = %s")
+            params.append(json.dumps(result, default=str))
+        params += [job_id, status, stale_sec]
+        self.cursor.execute(f"""
+            UPDATE ingestion_jobs SET {', '.join(fields)}
+            WHERE job_id = %s AND status = %s
+              AND (heartbeat_at IS NULL OR heartbeat_at < NOW() - INTERVAL %s SECOND)
+        """, tuple(params))
+        self.conn.commit()
+        return self.cursor.rowcount == 1
+
+    def register_file(self, workspace_name, file_name, file_path, doc_type, added_at):
+        """
+        Atomically record an uploaded file unless (workspace_name, file_name) is already taken.
+
+        Returns:
+            bool: True if the file was added, False if it already existed
+        """
+        self.cursor.execute("""
+            INSERT IGNORE INTO file_registry (workspace_name, file_name, file_path, doc_type, added_at)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (workspace_name or "", file_name, file_path, doc_type, added_at))
+        self.conn.commit()
+        return self.cursor.rowcount == 1
+
+    def is_file_registered(self, workspace_name, file_name):
+        self.cursor.execute(
+            "SELECT id FROM file_registry WHERE workspace_name = %s AND file_name = %s",
+            (workspace_name or "", file_name)
+        )
+        return self.cursor.fetchone() is not None
+
+    def unregister_file(self, file_name, workspace_name=None):
+        """
+        Remove an uploaded file record. Without a workspace every workspace's entry
+        for that file name is removed.
+
+        Returns:
+            int: Number of records removed
+        """
+        if workspace_name is None:
+            self.cursor.execute("DELETE FROM file_registry WHERE file_name = %s", (file_name,))
+        else:
+            self.cursor.execute(
+                "DELETE FROM file_registry WHERE workspace_name = %s AND file_name = %s",
+                (workspace_name, file_name)
+            )
+        self.conn.commit()
+        return self.cursor.rowcount
+
+    def get_content_entry(self, content_hash):
+        """Get a content_store row by hash, or None"""
+        try:
+            self.cursor.execute(
+                "SELECT content_hash, file_ext, ref_count FROM content_store WHERE content_hash = %s",
+                (content_hash,)
+            )
+            return self.cursor.fetchone()
+        except Exception as e:
+            print(f"Database error in get_content_entry: {str(e)}")
+            return None
+
+    def add_content_ref(self, content_hash, file_ext=None):
+        """Take a reference on a content entry, creating the row on first use"""
+        self.cursor.execute("""
+            INSERT INTO content_store (content_hash, file_ext, ref_count)
+            VALUES (%s, %s, 1)
+            ON DUPLICATE KEY UPDATE ref_count = ref_count + 1
+        """, (content_hash, file_ext))
+        self.conn.commit()
+
+    def acquire_content_ref(self, content_hash):
+        """
+        Take a reference on an existing, still referenced content entry in one statement,
+        so a concurrent release can't remove it between the check and the increment.
+
+        Returns:
+            bool: True if the reference was taken
+        """
+        self.cursor.execute(
+            "UPDATE content_store SET ref_count = ref_count + 1 WHERE content_hash = %s AND ref_count > 0",
+            (content_hash,)
+        )
+        self.conn.commit()
+        return self.cursor.rowcount == 1
+
+    def release_content_ref(self, content_hash):
+        """
+        Drop a reference on a content entry, deleting the row when none are left.
+
+        Returns:
+            int: References left, or None if the entry didn't exist
+        """
+        self.cursor.execute(
+            "UPDATE content_store SET ref_count = ref_count - 1 WHERE content_hash = %s",
+            (content_hash,)
+        )
+        if self.cursor.rowcount == 0:
+            return None
+        self.cursor.execute(
+            "SELECT ref_count FROM content_store WHERE content_hash = %s", (content_hash,)
+        )
+        remaining = self.cursor.fetchone()["ref_count"]
+        if remaining <= 0:
+            self.cursor.execute(
+                "DELETE FROM content_store WHERE content_hash = %s AND ref_count <= 0", (content_hash,)
+            )
+        self.conn.commit()
+        return remaining
+
+    def _decode_ingestion_job(self, row):
+        for key in ("stages", "payload", "result"):
+            row[key] = json.loads(row[key]) if row[key] else None
+        for key in ("created_at", "updated_at"):
+            if row[key]:
+                row[key] = row[key].strftime('%Y-%m-%d %H:%M:%S')
+        return row
+
 if __name__ == "__main__":
     database = Database()
     print(f"Testing database functions...")
@@ -11,6 +11,11 @@ import os
 import stat
 from logging_Setup import get_logger
 import database 
+import json_functions as JC
+from context_cache import context_cache
+from content_store import content_store
+from answer_cache import answer_cache
+from metadata_store import get_metadata_store
 logger=get_logger(__name__)
 
 def get_db():
@@ -19,7 +24,6 @@ def get_db():
 
 DOCS_METADATA_PATH = cfg.DOCS_METADATA_FILE
 IMAGE_METADATA_PATH = cfg.IMAGES_METADATA_FILE
-FILE_LIST=cfg.ALL_FILES_LIST
 UPLOAD_DIR=cfg.UPLOAD_DIR
 ALLOWED_IMAGE_EXTENSIONS=cfg.ALLWOED_IMAGE_EXTENSIONS
 
@@ -114,6 +118,7 @@ def delete_workspace_api(workspaceInfo):
             logger.error(f"Error deleting workspace directories: {e}")
             # Continue anyway
                 
+        answer_cache.invalidate_workspace(workspace_name)
         logger.info(f"Workspace '{workspace_name}' deleted successfully.")
         return True
 
@@ -205,7 +210,7 @@ def delete_document(doc_name,workspace=None):
     db = get_db()
     try:
         
-        doc_id = delete_from_docs_metadata(doc_name,workspace)
+        doc_id, content_hash = delete_from_docs_metadata(doc_name,workspace)
         
         if doc_id is None:
             logger.warning(f"Document {doc_name} not found in metadata.")
@@ -242,15 +247,13 @@ def delete_document(doc_name,workspace=None):
 
         # Check if doc_id is a list or a single value
         if isinstance(doc_id, list):
-            # It's a list - iterate through each doc_id
-            for single_doc_id in doc_id:
-                isDocID = db.get_contentPath_fromDocument(single_doc_id)
-                if isDocID:
-                    # Delete the document from the database
-                    db.delete_doc(single_doc_id)
-                    print(f"Deleted document with ID: {single_doc_id}")
-                else:
-                    print(f"Document with ID {single_doc_id} not found in database.")
+            # It's a list - resolve all ids in one query, chunk ids have no documents row
+            content_paths = db.get_content_paths(doc_id)
+            for single_doc_id, content_path in content_paths.items():
+                # Delete the document from the database
+                db.delete_doc(single_doc_id)
+                context_cache.invalidate(content_path)
+                print(f"Deleted document with ID: {single_doc_id}")
         else:
             # It's a single value - process normally
             isDocID = db.get_contentPath_fromDocument(doc_id)
@@ -261,6 +264,12 @@ def delete_document(doc_name,workspace=None):
             else:
                 print(f"Document with ID {doc_id} not found in database.")
 
+        # Release the shared content-store artifacts, removed with their last reference
+        content_store.release(content_hash)
+
+        # Cached answers may cite the deleted document
+        answer_cache.invalidate_workspace(workspace)
+
         print(f"Document {doc_name} deleted successfully.")
         return True
     except Exception as e:
@@ -276,19 +285,18 @@ def delete_image(image_name, workspace):
         doc_id = None
         doc_type = os.path.splitext(os.path.basename(image_name))[1].lower()
         
-        with open(IMAGE_METADATA_PATH, "r") as file:
-            data = json.load(file)
-            
-            # Iterate through all entries to find the matching image
-            for key, value in data.items():
-                # Check both workspace name and filename
-                metadata_workspace = value.get('workspace_name', '')
-                original_path = value.get('original_path', '')
-                original_filename = os.path.basename(original_path)
-                
-                if metadata_workspace == workspace and original_filename == image_name:
-                    doc_id = key  # The key in the JSON is the doc_id
-                    break
+        data = get_metadata_store(IMAGE_METADATA_PATH).all()
+
+        # Iterate through all entries to find the matching image
+        for key, value in data.items():
+            # Check both workspace name and filename
+            metadata_workspace = value.get('workspace_name', '')
+            original_path = value.get('original_path', '')
+            original_filename = os.path.basename(original_path)
+
+            if metadata_workspace == workspace and original_filename == image_name:
+                doc_id = key  # The key in the metadata is the doc_id
+                break
         
         if doc_id is None:
             print(f"Image {image_name} not found in metadata for workspace {workspace}.")
@@ -330,6 +338,8 @@ def delete_image(image_name, workspace):
         if result:
             print(f"Image metadata removed for doc_id: {doc_id}")
 
+        answer_cache.invalidate_workspace(workspace)
+
         print(f"Image {image_name} deleted successfully.")
         return True
     except Exception as e:
@@ -337,77 +347,48 @@ def delete_image(image_name, workspace):
         logger.error(f"Error deleting image {image_name} from workspace {workspace}: {str(e)}")
         return False
 
-# here this function is delete the file details from the all_files_list.json
-def delete_file_from_list(file_name: str,workspace,file_path=FILE_LIST):
-    
-    # Read the existing data from the JSON file
+# here this function is delete the file details from the file registry
+def delete_file_from_list(file_name: str,workspace):
     try:
-        with open(file_path, 'r+') as file:
-            data = json.load(file)
-            
-            # Find the entry with the specified file name in the file_path
-            updated_data = [entry for entry in data if file_name not in entry['file_path'] and entry['workspace_name']!=workspace]
-            
-            # Check if any entry was removed
-            if len(data) != len(updated_data):
-                # Write the updated data back to the JSON file
-                file.seek(0)
-                json.dump(updated_data, file, indent=2)
-                file.truncate()
-                logger.info(f"File name {file_name} deleted from the all file json list.")
-            else:
-                logger.warning(f"File name {file_name} not found in the list.")
+        if JC.remove_file_from_json(file_name, workspace):
+            logger.info(f"File name {file_name} deleted from the file registry.")
+        else:
+            logger.warning(f"File name {file_name} not found in the file registry.")
     except Exception as e:
         print(f"Error deleting file name from list: {e}")
 
 def delete_from_docs_metadata(doc_name: str,worskspace,file_path= DOCS_METADATA_PATH):
-    """Delete a document entry from the JSON metadata file."""
+    """Delete a document entry from the metadata store, returns (doc_id, content_hash)."""
     try:
-        # Read the existing data from the JSON file
-        with open(file_path, 'r+') as file:
-            data = json.load(file)
-            
-            print("delete_from_docs_metadata :: doc_name =",doc_name)
-            print("delete_from_docs_metadata :: worskspace =",worskspace)
-            # Check if the doc_id exists in the data
-            if doc_name in data and data[doc_name]['workspace_name'] == worskspace:
-                # Remove the entry with the specified doc_id
-                doc_id=data[doc_name]['doc_id']
-                del data[doc_name]
-                
-                # Write the updated data back to the JSON file
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
-                print(f"Document {doc_name} deleted successfully from docs metadata.")
-                return doc_id
-            else:
-                print(f"Document of id/name: {doc_name} not found in the metadata file {file_path}.")
-                return None
+        print("delete_from_docs_metadata :: doc_name =",doc_name)
+        print("delete_from_docs_metadata :: worskspace =",worskspace)
+        entry = get_metadata_store(file_path).pop(
+            doc_name, predicate=lambda value: value['workspace_name'] == worskspace)
+        if entry is None:
+            print(f"Document of id/name: {doc_name} not found in the metadata file {file_path}.")
+            return None, None
+
+        doc_id=entry['doc_id']
+        content_hash = entry.get('content_hash')
+        parent_doc_id = entry.get('parent_doc_id')
+        if parent_doc_id:
+            # Chunked PDF/DOCX, the documents table row is keyed by the parent id
+            doc_id = list(doc_id) + [parent_doc_id]
+        print(f"Document {doc_name} deleted successfully from docs metadata.")
+        return doc_id, content_hash
     except Exception as e:
         print(f"Error deleting document: {e}")
-        return None
+        return None, None
 
 def delete_from_image_metadata(doc_id: str,worskspace,file_path= IMAGE_METADATA_PATH):
-    """Delete a document entry from the JSON metadata file."""
+    """Delete a document entry from the metadata store."""
     try:
-        # Read the existing data from the JSON file
-        with open(file_path, 'r+') as file:
-            data = json.load(file)
-            
-            # Check if the doc_id exists in the data
-            if doc_id in data and data[doc_id]["workspace_name"]==worskspace:
-                # Remove the entry with the specified doc_id
-                del data[doc_id]
-                
-                # Write the updated data back to the JSON file
-                file.seek(0)
-                json.dump(data, file, indent=2)
-                file.truncate()
-                return doc_id
-            else:
-                print(f"Document of id/name: {doc_id} not found in the metadata file {file_path}.")
-                return None
+        entry = get_metadata_store(file_path).pop(
+            doc_id, predicate=lambda value: value["workspace_name"] == worskspace)
+        if entry is None:
+            print(f"Document of id/name: {doc_id} not found in the metadata file {file_path}.")
+            return None
+        return doc_id
     except Exception as e:
         print(f"Error deleting document: {e}")
         return None
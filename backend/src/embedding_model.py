@@ -1,18 +1,134 @@
-from sentence_transformers import SentenceTransformer  # Add this import
+from sentence_transformers import SentenceTransformer, CrossEncoder  # Add this import
 import torch
 import clip
 from PIL import Image
 import numpy as np
+import os
+import threading
+import time
+from logging_Setup import get_logger
+import config as cfg
 
+logger = get_logger(__name__)
+
+TEXT_MODEL_NAME = "all-mpnet-base-v2"
+CLIP_MODEL_NAME = "ViT-B/32"
+
+
+def _current_rss_mb():
+    """Resident memory of this process in MB, or None if it can't be read"""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024  # value is in kB
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is the peak RSS in kB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except (ImportError, AttributeError):
+        return None
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of the embedding models.
+    Each model is loaded lazily on first use and then reused for the life of the process,
+    so Summarizer(), VectorStore() and ImageProcessor() no longer reload weights from disk.
+    """
 
-class MultiModalEmbedder:
     def __init__(self):
         self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.text_model = SentenceTransformer('all-mpnet-base-v2')
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get_or_load(self, name, loader):
+        # Fast path, no locking once the model is loaded
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        with self._lock:
+            # Another thread may have loaded it while we were waiting
+            model = self._models.get(name)
+            if model is not None:
+                return model
+
+            rss_before = _current_rss_mb()
+            start_time = time.perf_counter()
+            model = loader()
+            load_time = time.perf_counter() - start_time
+            rss_after = _current_rss_mb()
+
+            self._stats[name] = {
+                "load_time_sec": round(load_time, 3),
+                "rss_before_mb": round(rss_before, 1) if rss_before is not None else None,
+                "rss_after_mb": round(rss_after, 1) if rss_after is not None else None,
+                "rss_delta_mb": round(rss_after - rss_before, 1)
+                if rss_before is not None and rss_after is not None else None,
+                "device": self.device,
+                "pid": os.getpid()
+            }
+            logger.info(f"Loaded model '{name}' in {load_time:.2f}s on {self.device} | stats: {self._stats[name]}")
+
+            self._models[name] = model
+            return model
+
+    def get_text_model(self):
+        return self._get_or_load(
+            TEXT_MODEL_NAME,
+            lambda: SentenceTransformer(TEXT_MODEL_NAME, device=self.device))
+
+    def get_clip_model(self):
+        """Returns the (model, preprocess) tuple from clip.load"""
+        return self._get_or_load(
+            CLIP_MODEL_NAME,
+            lambda: clip.load(CLIP_MODEL_NAME, device=self.device))
 
+    def get_reranker_model(self):
+        """Local cross-encoder used to rerank retrieved contexts"""
+        return self._get_or_load(
+            cfg.RERANKER_MODEL_NAME,
+            lambda: CrossEncoder(cfg.RERANKER_MODEL_NAME, device=self.device))
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def get_stats(self):
+        """Load time and memory usage of every model loaded so far"""
+        with self._lock:
+            return {
+                "loaded_models": list(self._models.keys()),
+                "models": {name: dict(stats) for name, stats in self._stats.items()},
+                "current_rss_mb": _current_rss_mb()
+            }
+
+
+# Shared registry for the whole process
+model_registry = ModelRegistry()
+
+
+class MultiModalEmbedder:
+    def __init__(self, registry=None):
+        # Cheap to construct, the models live in the shared registry
+        self.registry = registry or model_registry
+        self.device = self.registry.device
+
+    @property
+    def text_model(self):
+        return self.registry.get_text_model()
+
+    @property
+    def clip_model(self):
         # CLIP remains for images
-        self.clip_model, self.preprocess = clip.load(
-            "ViT-B/32", device=self.device)
+        return self.registry.get_clip_model()[0]
+
+    @property
+    def preprocess(self):
+        return self.registry.get_clip_model()[1]
 
     def get_image_embedding(self, image_path):
         """Get 768-dim embedding for images using CLIP with padding"""
@@ -32,3 +148,23 @@ class MultiModalEmbedder:
     def get_text_embedding(self, text):
         """Unified text embedding for all text content"""
         return self.text_model.encode(text).tolist()
+
+    def get_text_embeddings(self, texts, batch_size=cfg.TEXT_EMBEDDING_BATCH_SIZE):
+        """
+        Batched text embedding for chunked documents
+
+        Args:
+            texts (list[str]): Texts to embed
+            batch_size (int): Number of texts encoded per forward pass
+
+        Returns:
+            np.ndarray: Matrix of shape (len(texts), dim), one row per text
+        """
+        if not texts:
+            return np.empty((0, self.text_model.get_sentence_embedding_dimension()), dtype=np.float32)
+        return self.text_model.encode(
+            list(texts),
+            batch_size=batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False
+        )
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response, stream_with_context
 import sys
 import os
 import datetime
+import json
 
 # Add parent directory to path to import
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from chat import answer_question
+from chat import answer_question, stream_answer_events
 from logging_Setup import get_logger
 
 logger= get_logger(__name__)
@@ -28,9 +29,10 @@ def chat():
         message = data['inputData']
         workspace = data.get('workspace')
         question_type = data.get('questionType')
+        relevance_mode = data.get('relevanceMode')  # optional: "llm" or "reranker"
 
         # Call the answer_question function from the chat module
-        answer = answer_question(message,question_type, workspace)
+        answer = answer_question(message,question_type, workspace, relevance_mode)
 
         return jsonify({"answer": answer}), 200
     except Exception as e:
@@ -41,3 +43,45 @@ def chat():
                 "error_type": "internal_error"
             }), 500
 
+
+
+def _sse(event, data):
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chat_processing_bp.route('/stream', methods=['POST'])
+def chat_stream():
+    """
+    Same request body as /process, but the answer is streamed back as Server-Sent Events:
+    retrieval (sources), token (answer text, repeated), then done or error.
+    """
+    data = request.get_json()
+    if not data or 'inputData' not in data:
+        return jsonify({
+                "status": "error",
+                "message": "Missing required parameter",
+                "error_type": "missing_parameter"
+            }), 400
+
+    message = data['inputData']
+    workspace = data.get('workspace')
+    question_type = data.get('questionType')
+    relevance_mode = data.get('relevanceMode')  # optional: "llm" or "reranker"
+
+    def generate():
+        try:
+            for event, payload in stream_answer_events(message, question_type, workspace, relevance_mode):
+                yield _sse(event, payload)
+        except Exception as e:
+            logger.error(f"Unexpected Error in chat stream endpoint: {str(e)}")
+            yield _sse("error", {"message": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # stop reverse proxies from buffering the stream
+        }
+    )
@@ -6,6 +6,8 @@ import datetime
 # Add parent directory to path to import process_files_api
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from process_files import process_files_api, generate_image_description
+from ingestion_jobs import job_queue
+import config as cfg
 
 # Create Blueprint for file processing routes
 file_processing_bp = Blueprint('file_processing', __name__)
@@ -25,6 +27,19 @@ def process_file_api_route():
         file_path = data['file_path']
         image_metadata = data.get('image_metadata', {})
         workspace_name = data.get('workspace_name', None)
+        run_async = data.get('async', cfg.ASYNC_INGESTION)
+
+        if run_async:
+            # Queue the job and return at once, progress is read from /jobs/<job_id>
+            job_id = job_queue.submit(file_path, image_metadata, workspace_name)
+            return jsonify({
+                "status": "accepted",
+                "message": "File queued for processing",
+                "data": {
+                    "job_id": job_id,
+                    "status_url": f"/process_file/jobs/{job_id}"
+                }
+            }), 202
         
         # Process file and get response
         result = process_files_api(file_path, image_metadata, workspace_name)
@@ -54,6 +69,39 @@ def process_file_api_route():
         }), 500
     
 
+@file_processing_bp.route('/jobs/<job_id>', methods=['GET'])
+def get_processing_job(job_id):
+    """Status and per-stage progress of a queued ingestion job"""
+    try:
+        job = job_queue.get(job_id)
+        if not job:
+            return jsonify({
+                "status": "error",
+                "message": f"Job '{job_id}' not found",
+                "error_type": "not_found"
+            }), 404
+
+        return jsonify({
+            "status": "success",
+            "data": {
+                "job_id": job["job_id"],
+                "job_status": job["status"],
+                "stage": job["stage"],
+                "stages": job["stages"] or [],
+                "result": job["result"],
+                "created_at": job["created_at"],
+                "updated_at": job["updated_at"]
+            }
+        }), 200
+
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e),
+            "error_type": "server_error"
+        }), 500
+
+
 @file_processing_bp.route('/generate_image_description', methods=['GET'])
 def generate_image_description_api():
     try:
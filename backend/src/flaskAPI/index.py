@@ -16,11 +16,25 @@ load_dotenv()
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import config as cfg
 from logging_Setup import get_logger
+from embedding_model import model_registry
+from database import ensure_schema
+from context_cache import context_cache
+from answer_cache import answer_cache
+from rate_limiter import gemini_limiter
+from ingestion_jobs import job_queue
 
 logger= get_logger(__name__)
 
 log_file_dir=cfg.LOGS_FILE
 
+# Spawned extraction workers import this module as __mp_main__, they must not
+# migrate the schema or claim ingestion jobs
+if __name__ != "__mp_main__":
+    # Apply pending schema migrations once, before serving any request
+    ensure_schema()
+    # Start the ingestion heartbeat and take over jobs left by stopped processes
+    job_queue.recover()
+
 app = Flask(__name__)
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB limit
 
@@ -48,7 +62,9 @@ app.register_blueprint(file_access, url_prefix='/fileAccess')
 app.register_blueprint(auth_bp, url_prefix='/auth')
 
 PASSWORD = os.environ["ADMIN_PASSWORD"]
-EXCLUDE_PATHS = ['/health','/auth/validate', '/fileAccess/' ]
+EXCLUDE_PATHS = ['/auth/validate', '/fileAccess/' ]
+# Only the bare liveness probe is public, /health/* stats expose internal state and need the key
+EXCLUDE_EXACT_PATHS = ['/health']
 
 @app.errorhandler(Exception)
 def handle_error(e):
@@ -82,7 +98,7 @@ def global_basic_auth():
         return response, 200
     
     # Check if path should be excluded from authentication
-    should_exclude = False
+    should_exclude = request.path in EXCLUDE_EXACT_PATHS
     for path in EXCLUDE_PATHS:
         if request.path.startswith(path):
             should_exclude = True
@@ -112,6 +128,26 @@ def global_basic_auth():
 def health_check():
     return jsonify({"status": "ok", "message": "Service is running"}), 200
 
+@app.route('/health/models', methods=['GET'])
+def model_stats():
+    # Load time and memory of the shared embedding models
+    return jsonify({"status": "ok", "data": model_registry.get_stats()}), 200
+
+@app.route('/health/context_cache', methods=['GET'])
+def context_cache_stats():
+    # Hit, miss and eviction counters of the parsed context cache
+    return jsonify({"status": "ok", "data": context_cache.get_stats()}), 200
+
+@app.route('/health/answer_cache', methods=['GET'])
+def answer_cache_stats():
+    # Hit rate and invalidations of the semantic answer cache
+    return jsonify({"status": "ok", "data": answer_cache.get_stats()}), 200
+
+@app.route('/health/gemini_limiter', methods=['GET'])
+def gemini_limiter_stats():
+    # Queue wait, throttling and 429 counters of the shared Gemini limiter
+    return jsonify({"status": "ok", "data": gemini_limiter.get_stats()}), 200
+
 @app.route('/logs', methods=['POST'])
 def store_logs():
     print("/logs endpoint called")
@@ -3,6 +3,7 @@ import google.generativeai as genai
 
 import json
 from dotenv import load_dotenv
+from rate_limiter import gemini_limiter, estimate_tokens, IMAGE_TOKENS
 load_dotenv()
 
 genai.configure(api_key=os.environ["GEMINI_API_KEY"])
@@ -59,9 +60,9 @@ def generate_image_title_dscrpt(image_path):
     )
 
     try:
-        response = chat_session.send_message(
-            """Analyze this image and follow the system instruction """
-        )
+        message = """Analyze this image and follow the system instruction """
+        with gemini_limiter.limit(tokens=estimate_tokens(message) + IMAGE_TOKENS):
+            response = chat_session.send_message(message)
 
         # Clean the response
         json_str = response.text.replace(
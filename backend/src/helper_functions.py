@@ -59,19 +59,23 @@ def save_text_to_file(text, directory):
 
     return filepath
 
-def revert_fileAdded(file_path):
-    # Cleanup code...
+def revert_fileAdded(file_path, workspace_name=None):
+    # Cleanup code, only touches the failed upload's workspace
         file_name = os.path.basename(file_path)
-        output_path = f"media/output/{file_name}"
-        base_dir=cfg.BASE_DIR
-        output_path = os.path.join(base_dir, output_path)
+        if workspace_name:
+            output_path = os.path.join(cfg.OUTPUT_DIR, workspace_name, file_name)
+        else:
+            output_path = f"media/output/{file_name}"
+            base_dir=cfg.BASE_DIR
+            output_path = os.path.join(base_dir, output_path)
         
         # Check if the output directory exists and remove it
         util.remove_files(output_path)
        
         # Also remove from all_files_list metadata records
         try:
-            JC.remove_file_from_json(file_path)
+            # Uploads without a workspace are registered under '', never drop other workspaces' rows
+            JC.remove_file_from_json(file_path, workspace_name or "")
             logger.info(f"Removed file from metadata records: {file_path}")
         except Exception as record_error:
             logger.error(f"Error removing metadata records: {record_error}")
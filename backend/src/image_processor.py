@@ -9,6 +9,7 @@ import numpy as np
 from embedding_model import MultiModalEmbedder  # Updated import path
 from datetime import datetime
 import config as cfg
+from metadata_store import get_metadata_store
 from logging_Setup import get_logger
 
 logger = get_logger(__name__)
@@ -102,30 +103,9 @@ class ImageProcessor:
         return new_path
 
     def _update_metadata_file(self, doc_id, metadata):
-        """Update the central metadata JSON file"""
+        """Update the central metadata store (append-only, see metadata_store)"""
         try:
-            # Initialize empty data if file doesn't exist
-            if not os.path.exists(self.metadata_file):
-                data = {}
-            else:
-                # Handle empty file case
-                if os.path.getsize(self.metadata_file) == 0:
-                    data = {}
-                else:
-                    with open(self.metadata_file, "r") as f:
-                        try:
-                            data = json.load(f)
-                        except json.JSONDecodeError:
-                            print("Corrupted metadata file, resetting...")
-                            data = {}
-
-            data[doc_id] = metadata
-
-            with open(self.metadata_file, "w") as f:
-                json.dump(data, f, indent=2)
-
+            get_metadata_store(self.metadata_file).set(doc_id, metadata)
         except Exception as e:
             print(f"Metadata update failed: {str(e)}")
-            # Create empty file as fallback
-            with open(self.metadata_file, "w") as f:
-                json.dump({}, f)
+            raise
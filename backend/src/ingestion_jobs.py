@@ -0,0 +1,147 @@
+"""
+Asynchronous ingestion job queue.
+/process_file/process enqueues a job and returns its id at once. A bounded worker pool
+runs process_files_api in the background and records per-stage progress in the
+ingestion_jobs table, so slow OCR/LLM work never holds a Flask request thread.
+
+Every job is owned by the process that runs it, which refreshes the job's heartbeat.
+Several processes (gunicorn workers, a second instance) can share the table: only jobs
+whose owner stopped sending heartbeats are recovered, and each by exactly one process.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import socket
+import threading
+import time
+import uuid
+import config as cfg
+import database
+from process_files import process_files_api
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+
+def get_db():
+    return database.Database()
+
+
+class IngestionJobQueue:
+    def __init__(self, max_workers, heartbeat_sec=cfg.INGESTION_HEARTBEAT_SEC, stale_sec=cfg.INGESTION_JOB_STALE_SEC):
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingestion")
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat_sec = heartbeat_sec
+        self.stale_sec = stale_sec
+        self._heartbeat_thread = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, file_path, image_metadata=None, workspace_name=None):
+        """Persist a new job and hand it to the worker pool, returns the job id"""
+        job_id = str(uuid.uuid4())
+        payload = {
+            "file_path": file_path,
+            "image_metadata": image_metadata or {},
+            "workspace_name": workspace_name
+        }
+        with get_db() as db:
+            db.create_ingestion_job(job_id, payload, owner=self.owner)
+        self._pool.submit(self._run, job_id, payload)
+        logger.info(f"Queued ingestion job {job_id} for {file_path}")
+        return job_id
+
+    def get(self, job_id):
+        with get_db() as db:
+            return db.get_ingestion_job(job_id)
+
+    def recover(self):
+        """
+        Start this process's heartbeat and take over the jobs of dead processes.
+        Safe to call from every worker process, later calls in one process are a no-op.
+        """
+        with self._start_lock:
+            if self._heartbeat_thread is not None:
+                return
+            self._heartbeat_thread = threading.Thread(
+                target=self._heartbeat_loop, name="ingestion-heartbeat", daemon=True)
+            self._heartbeat_thread.start()
+        self._recover_stale()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(self.heartbeat_sec)
+            try:
+                with get_db() as db:
+                    db.heartbeat_ingestion_jobs(self.owner)
+                # A process may die while others keep running, look for orphans regularly
+                self._recover_stale()
+            except Exception as e:
+                logger.error(f"Ingestion heartbeat failed: {str(e)}")
+
+    def _recover_stale(self):
+        """
+        Jobs running in a dead process are marked failed because they may be half done,
+        queued ones are claimed and run here.
+        """
+        claimed = []
+        with get_db() as db:
+            for job in db.get_stale_ingestion_jobs([JOB_RUNNING, JOB_QUEUED], self.stale_sec):
+                if job["status"] == JOB_RUNNING:
+                    if db.take_over_stale_ingestion_job(
+                            job["job_id"], JOB_RUNNING, self.owner, self.stale_sec, new_status=JOB_FAILED, result={
+                                "status": "error",
+                                "message": "Processing was interrupted by a server restart",
+                                "error_type": "processing_interrupted"
+                            }):
+                        logger.warning(f"Marked interrupted ingestion job {job['job_id']} "
+                                       f"of {job['owner']} as failed")
+                elif db.take_over_stale_ingestion_job(job["job_id"], JOB_QUEUED, self.owner, self.stale_sec):
+                    claimed.append(job)
+
+        for job in claimed:
+            self._pool.submit(self._run, job["job_id"], job["payload"])
+        if claimed:
+            logger.info(f"Took over {len(claimed)} queued ingestion job(s) from stopped processes")
+
+    def _run(self, job_id, payload):
+        stages = []
+
+        def progress(stage):
+            stages.append({"stage": stage, "at": datetime.utcnow().isoformat()})
+            with get_db() as db:
+                db.update_ingestion_job(job_id, stage=stage, stages=stages)
+
+        try:
+            with get_db() as db:
+                db.update_ingestion_job(job_id, status=JOB_RUNNING, stage="started")
+
+            result = process_files_api(
+                payload["file_path"],
+                payload.get("image_metadata"),
+                payload.get("workspace_name"),
+                progress=progress
+            )
+            status = JOB_SUCCEEDED if result.get("status") == "success" else JOB_FAILED
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} crashed: {str(e)}")
+            result = {
+                "status": "error",
+                "message": f"An unexpected error occurred: {str(e)}",
+                "error_type": "unexpected_error"
+            }
+            status = JOB_FAILED
+
+        stages.append({"stage": "done", "at": datetime.utcnow().isoformat()})
+        with get_db() as db:
+            db.update_ingestion_job(job_id, status=status, stage="done", stages=stages, result=result)
+        logger.info(f"Ingestion job {job_id} finished with status {status}")
+
+
+# Shared queue for the whole process
+job_queue = IngestionJobQueue(cfg.INGESTION_WORKERS)
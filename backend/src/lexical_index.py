@@ -0,0 +1,198 @@
+"""
+BM25 inverted index kept next to each Chroma collection.
+
+Dense search misses exact tokens such as invoice numbers, API keys and model names,
+so every row added to a collection is also tokenized here. Per-row term frequencies
+are persisted in a MetadataStore (one log append per add/delete, no rebuild), and
+the postings are derived from them in memory. Writes by another process are read
+back from the store's log and applied to the postings, only a compaction of the
+store (size-based, rare) triggers a full reload.
+"""
+
+from collections import Counter, defaultdict
+import heapq
+import math
+import os
+import re
+import threading
+import config as cfg
+from metadata_store import get_metadata_store
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+# Words joined by -_./:@ stay one token ("inv-2024-0042"), their parts are indexed too
+_TOKEN_RE = re.compile(r"\w+(?:[-./:@]\w+)*")
+_PART_RE = re.compile(r"[-_./:@]")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from has have how i in is it its me my of on or "
+    "that the their there this to was we were what when where which who why will with you your".split())
+
+
+def tokenize(text):
+    """Lowercased terms of text, compound tokens are kept whole and also split into parts"""
+    terms = []
+    for match in _TOKEN_RE.finditer((text or "").lower()):
+        token = match.group()
+        if token not in _STOPWORDS:
+            terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in _PART_RE.split(token) if part and part not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    def __init__(self, path, k1=cfg.BM25_K1, b=cfg.BM25_B):
+        self.store = get_metadata_store(path, compact_bytes=cfg.LEXICAL_INDEX_COMPACT_BYTES)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)  # term -> {doc_id: term frequency}
+        self._docs = {}                     # doc_id -> (workspace_name, length, terms)
+        self._total_length = 0
+        self._version = None                # store version the postings reflect
+
+    def _add_posting(self, doc_id, entry):
+        self._remove_posting(doc_id)
+        for term, count in entry["tf"].items():
+            self._postings[term][doc_id] = count
+        self._docs[doc_id] = (entry.get("workspace_name"), entry["length"], tuple(entry["tf"]))
+        self._total_length += entry["length"]
+
+    def _remove_posting(self, doc_id):
+        if doc_id not in self._docs:
+            return
+        _, length, terms = self._docs.pop(doc_id)
+        self._total_length -= length
+        for term in terms:
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def _reload(self):
+        """Rebuild the postings from the store, caller must hold the lock"""
+        entries, self._version = self.store.snapshot()
+        self._postings = defaultdict(dict)
+        self._docs = {}
+        self._total_length = 0
+        for doc_id, entry in entries.items():
+            self._add_posting(doc_id, entry)
+        logger.info(f"Loaded BM25 index {self.store.path} ({len(self._docs)} rows, {len(self._postings)} terms)")
+
+    def _sync(self):
+        """Apply writes made since the postings were built, caller must hold the lock"""
+        if self._version is None:
+            self._reload()
+            return
+        records, version = self.store.changes_since(self._version)
+        if records is None:
+            self._reload()
+            return
+        for record in records:
+            if record.get("op") == "set":
+                self._add_posting(record["key"], record["value"])
+            elif record.get("op") == "delete":
+                self._remove_posting(record["key"])
+        self._version = version
+
+    def _write(self, items=None, deletes=None):
+        """Persist a change and apply it to the postings, caller must hold the lock"""
+        before, after = self.store.update(items=items, deletes=deletes)
+        if before != self._version:
+            # Someone else wrote in between, replay their records and ours from the log
+            self._sync()
+            return
+        for doc_id in deletes or []:
+            self._remove_posting(doc_id)
+        for doc_id, entry in (items or {}).items():
+            self._add_posting(doc_id, entry)
+        self._version = after
+
+    def add(self, doc_ids, texts, metadatas):
+        """Index (or re-index) rows, one log append for the whole batch"""
+        items = {}
+        for doc_id, text, metadata in zip(doc_ids, texts, metadatas):
+            terms = tokenize(text)
+            items[doc_id] = {
+                "workspace_name": (metadata or {}).get("workspace_name"),
+                "length": len(terms),
+                "tf": dict(Counter(terms))
+            }
+        with self._lock:
+            self._sync()
+            self._write(items=items)
+
+    def remove(self, doc_ids):
+        with self._lock:
+            self._sync()
+            self._write(deletes=[doc_id for doc_id in doc_ids if doc_id in self._docs])
+
+    def missing(self, doc_ids):
+        """IDs among doc_ids that aren't indexed yet"""
+        with self._lock:
+            self._sync()
+            return [doc_id for doc_id in doc_ids if doc_id not in self._docs]
+
+    def __len__(self):
+        with self._lock:
+            self._sync()
+            return len(self._docs)
+
+    def search(self, query, workspace_name=None, n_results=5):
+        """
+        BM25 ranking of the indexed rows for query.
+
+        Returns:
+            list[tuple]: (doc_id, score), best first
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            self._sync()
+            total_docs = len(self._docs)
+            if not total_docs:
+                return []
+            avg_length = self._total_length / total_docs or 1.0
+            scores = defaultdict(float)
+            for term in terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    doc_workspace, length, _ = self._docs[doc_id]
+                    if workspace_name and doc_workspace != workspace_name:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(n_results, scores.items(), key=lambda item: item[1])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(name):
+    """Index file for a collection ("text" or "image"), shared in-process like every MetadataStore"""
+    with _indexes_lock:
+        index = _indexes.get(name)
+        if index is None:
+            index = _indexes[name] = BM25Index(os.path.join(cfg.LEXICAL_INDEX_DIR, f"{name}_index.json"))
+        return index
+
+
+def reciprocal_rank_fusion(rankings, k=cfg.HYBRID_RRF_K):
+    """
+    Fuse several ranked ID lists, each ID scores sum(1 / (k + rank)).
+
+    Returns:
+        list[str]: IDs, best first
+    """
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
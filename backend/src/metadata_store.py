@@ -0,0 +1,275 @@
+"""
+Crash-safe key/value store behind docs_metadata.json and images_metadata.json.
+
+Writes are appended to a write-ahead log next to the JSON snapshot (<file>.log)
+instead of rewriting the whole file, so adding a record costs the same at 10 or
+10,000 entries. Once the log grows past METADATA_LOG_COMPACT_ENTRIES (or, for
+stores created with compact_bytes, past that many bytes and the snapshot's own
+size) it is folded back into the snapshot with an atomic replace. Both files are
+guarded by an in-process lock plus an OS file lock (<file>.lock) shared between
+processes.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import config as cfg
+from logging_Setup import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = get_logger(__name__)
+
+
+class MetadataStore:
+    def __init__(self, path, compact_entries=cfg.METADATA_LOG_COMPACT_ENTRIES, compact_bytes=None):
+        self.path = path
+        self.log_path = f"{path}.log"
+        self.lock_path = f"{path}.lock"
+        self.compact_entries = compact_entries
+        self.compact_bytes = compact_bytes  # size-based compaction instead of compact_entries
+        self._lock = threading.RLock()
+        self._data = {}
+        self._snapshot_key = None   # (mtime_ns, size) of the snapshot we loaded
+        self._log_offset = 0        # bytes of the log already applied to _data
+        self._log_entries = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            with open(self.lock_path, "a+") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                try:
+                    yield
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+                    else:
+                        lock_file.seek(0)
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _snapshot_stat(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            return {}
+        with open(self.path, "r") as f:
+            try:
+                return json.load(f)
+            except json.JSONDecodeError:
+                # Never reset a damaged snapshot to {}, keep it aside for recovery
+                corrupt_path = f"{self.path}.corrupt"
+                os.replace(self.path, corrupt_path)
+                logger.error(f"Corrupted metadata file {self.path}, moved to {corrupt_path}")
+                return {}
+
+    def _apply(self, record):
+        if record["op"] == "set":
+            self._data[record["key"]] = record["value"]
+        elif record["op"] == "delete":
+            self._data.pop(record["key"], None)
+
+    def _refresh(self):
+        """Bring _data up to date with the files, caller must hold the lock"""
+        snapshot_key = self._snapshot_stat()
+        if snapshot_key != self._snapshot_key:
+            # Compacted (possibly by another process) or first load, start over
+            self._data = self._read_snapshot()
+            self._snapshot_key = self._snapshot_stat()
+            self._log_offset = 0
+            self._log_entries = 0
+
+        if not os.path.exists(self.log_path):
+            self._log_offset = 0
+            return
+        if os.path.getsize(self.log_path) < self._log_offset:
+            # Log was truncated by a compaction we haven't seen yet
+            self._snapshot_key = None
+            return self._refresh()
+
+        with open(self.log_path, "rb") as f:
+            f.seek(self._log_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Torn write from a crash, skip it and let the next append overwrite it
+                    break
+                try:
+                    self._apply(json.loads(line))
+                except (json.JSONDecodeError, KeyError):
+                    logger.warning(f"Skipping bad record in {self.log_path}")
+                self._log_offset += len(line)
+                self._log_entries += 1
+
+    def _append(self, *records):
+        """Append records with a single write and fsync, caller must hold the lock"""
+        lines = b"".join(
+            (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8") for record in records)
+        with open(self.log_path, "r+b" if os.path.exists(self.log_path) else "wb") as f:
+            # Write at the last complete record so a torn tail is overwritten
+            f.seek(self._log_offset)
+            f.write(lines)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_offset += len(lines)
+        self._log_entries += len(records)
+        for record in records:
+            self._apply(record)
+
+        if self._should_compact():
+            self._compact()
+
+    def _should_compact(self):
+        if self.compact_bytes is None:
+            return self._log_entries >= self.compact_entries
+        # Rewrite the snapshot only once the log outweighs it, so large stores with
+        # large records don't pay a full rewrite every few writes
+        snapshot_size = self._snapshot_key[1] if self._snapshot_key else 0
+        return self._log_offset >= max(self.compact_bytes, snapshot_size)
+
+    def _compact(self):
+        """Fold the log into the snapshot, caller must hold the lock"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._data, f, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # A crash before the truncate only replays records already in the snapshot
+        with open(self.log_path, "wb") as f:
+            os.fsync(f.fileno())
+        self._snapshot_key = self._snapshot_stat()
+        self._log_offset = 0
+        self._log_entries = 0
+        logger.info(f"Compacted metadata store {self.path} ({len(self._data)} entries)")
+
+    def set(self, key, value):
+        with self._locked():
+            self._refresh()
+            self._append({"op": "set", "key": key, "value": value})
+
+    def get(self, key, default=None):
+        with self._locked():
+            self._refresh()
+            return self._data.get(key, default)
+
+    def pop(self, key, predicate=None):
+        """
+        Remove key and return its value, or None if it is missing
+        or predicate(value) is False. The check and the delete happen under one lock.
+        """
+        with self._locked():
+            self._refresh()
+            value = self._data.get(key)
+            if value is None or (predicate is not None and not predicate(value)):
+                return None
+            self._append({"op": "delete", "key": key})
+            return value
+
+    def all(self):
+        """Copy of every record, keyed by doc id"""
+        with self._locked():
+            self._refresh()
+            return dict(self._data)
+
+    def _version(self):
+        return (self._snapshot_key, self._log_offset)
+
+    def update(self, items=None, deletes=None):
+        """
+        Set several keys and delete others with one log write.
+
+        Returns:
+            tuple: (version before, version after) of the write, see version()
+        """
+        with self._locked():
+            self._refresh()
+            before = self._version()
+            records = [{"op": "set", "key": key, "value": value} for key, value in (items or {}).items()]
+            records += [{"op": "delete", "key": key} for key in set(deletes or []) if key in self._data]
+            if records:
+                self._append(*records)
+            return before, self._version()
+
+    def version(self):
+        """Token that changes on every write to the store, from this process or another one"""
+        with self._locked():
+            self._refresh()
+            return self._version()
+
+    def snapshot(self):
+        """
+        Copy of every record plus a version token that changes on every write,
+        from this process or another one. Lets callers keep a derived in-memory
+        view and only rebuild it when someone else wrote in between.
+        """
+        with self._locked():
+            self._refresh()
+            return dict(self._data), self._version()
+
+    def changes_since(self, version):
+        """
+        Records written after version (a token from version(), snapshot() or update())
+        and the current version. Records is None if the store was compacted in between,
+        the caller then has to start over from snapshot().
+
+        Returns:
+            tuple: (list of {"op", "key", "value"} records or None, version)
+        """
+        with self._locked():
+            self._refresh()
+            snapshot_key, offset = version
+            if snapshot_key != self._snapshot_key or offset > self._log_offset:
+                return None, self._version()
+            records = []
+            if offset < self._log_offset:
+                with open(self.log_path, "rb") as f:
+                    f.seek(offset)
+                    data = f.read(self._log_offset - offset)
+                for line in data.splitlines():
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        pass  # Already reported by _refresh
+            return records, self._version()
+
+    def compact(self):
+        with self._locked():
+            self._refresh()
+            self._compact()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_metadata_store(path, **options):
+    """
+    One MetadataStore per file, so every caller shares the same in-process lock.
+    options (compact_entries, compact_bytes) only apply when the store is created.
+    """
+    path = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = MetadataStore(path, **options)
+        return store
+
+
+docs_metadata = get_metadata_store(cfg.DOCS_METADATA_FILE)
+images_metadata = get_metadata_store(cfg.IMAGES_METADATA_FILE)
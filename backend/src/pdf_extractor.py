@@ -1,20 +1,148 @@
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
 import pdfplumber
 import camelot
 import os
-from pdf2image import convert_from_path
+import threading
+from pdf2image import convert_from_path, pdfinfo_from_path
 import pytesseract
 import json
 import json_functions as JC
 from qa_chain import QAChain
 from datetime import datetime
 import config as cfg
+from util import StageTimer
 
 #camelot.__ghostscript_path__ = r"C:\Program Files\gs\gs10.04.0\bin\gswin64c.exe"
 #pytesseract.pytesseract.tesseract_cmd = r'C:\\Users\\rajsu\\AppData\\Local\\Programs\\Tesseract-OCR\\tesseract.exe'
 
 
 OUTPUT_DIR = cfg.OUTPUT_DIR
+PAGE_IMAGE_DPI = 150
+
+# One lock per page image so concurrent requests render a page only once
+_render_locks = {}
+_render_locks_guard = threading.Lock()
+
+# Worker processes for page-parallel text/OCR and camelot, started once per process and
+# reused by every document. They are spawned, not forked: forking the server copies
+# locks held by its other threads (ingestion, grading, heartbeat) into the children.
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def _get_extract_pool():
+    global _extract_pool
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(
+                max_workers=max(1, cfg.PDF_EXTRACT_WORKERS),
+                mp_context=multiprocessing.get_context("spawn"))
+        return _extract_pool
+
+
+def _map_in_pool(fn, *iterables):
+    """pool.map() on the shared pool as a list, a pool broken by a dead worker is replaced once"""
+    global _extract_pool
+    pool = _get_extract_pool()
+    try:
+        return list(pool.map(fn, *iterables))
+    except BrokenProcessPool:
+        with _extract_pool_lock:
+            if _extract_pool is pool:
+                _extract_pool = None
+        pool.shutdown(wait=False)
+        return list(_get_extract_pool().map(fn, *iterables))
+
+
+def _extract_pages_text(pdf_path, first_page, last_page, tesseract_cmd):
+    """
+    Extract text of pages first_page..last_page (1-based, inclusive).
+    Module-level so it can run in a worker process; the tesseract path is passed in
+    because spawned workers don't inherit configure_paths().
+    """
+    pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    pages = []
+    with pdfplumber.open(pdf_path) as pdf:
+        for page_num in range(first_page, last_page + 1):
+            page = pdf.pages[page_num - 1]
+            print(f"Extracting text from page {page_num}/{len(pdf.pages)}...")
+            # Try regular extraction first
+            page_text = page.extract_text()
+            if not page_text:
+                # Fallback to OCR using Tesseract
+                img = page.to_image(resolution=300)
+                page_text = pytesseract.image_to_string(img.original)
+            pages.append((f"page_{page_num}", page_text))
+    return pages
+
+
+def ensure_page_image(pdf_path, page_num, img_path):
+    """
+    Render one PDF page to img_path if it isn't on disk yet (lazy page rendering).
+    Returns True when the image exists afterwards.
+    """
+    if os.path.exists(img_path):
+        return True
+    with _render_locks_guard:
+        lock = _render_locks.setdefault(img_path, threading.Lock())
+    with lock:
+        # Another request may have rendered it while we waited
+        if os.path.exists(img_path):
+            return True
+        try:
+            pages = convert_from_path(pdf_path, dpi=PAGE_IMAGE_DPI,
+                                      first_page=int(page_num), last_page=int(page_num))
+            if not pages:
+                return False
+            os.makedirs(os.path.dirname(img_path), exist_ok=True)
+            # Write to a temp file first so readers never see a half-written JPEG
+            tmp_path = f"{img_path}.tmp"
+            pages[0].save(tmp_path, "JPEG")
+            os.replace(tmp_path, img_path)
+            return True
+        except Exception as e:
+            print(f"Error rendering page {page_num} of {pdf_path}: {str(e)}")
+            return False
+
+
+def _page_may_have_table(page):
+    """
+    Cheap pdfplumber pre-screen. Pages without a text layer can't yield stream tables,
+    and a page needs either ruling lines or text laid out in rows and columns.
+    """
+    if not page.chars:
+        return False
+    if page.find_tables():
+        return True
+    text_tables = page.find_tables(table_settings={
+        "vertical_strategy": "text",
+        "horizontal_strategy": "text"
+    })
+    return any(len(table.rows) >= 3 and len(table.rows[0].cells) >= 2 for table in text_tables)
+
+
+def _read_tables_batch(pdf_path, pages, ghostscript_path):
+    """
+    Run camelot once for a comma-separated page list, returns [(page_num, markdown)].
+    Module-level so it can run in a worker process.
+    """
+    camelot.__ghostscript_path__ = ghostscript_path
+    try:
+        tables_list = camelot.read_pdf(
+            pdf_path,
+            flavor='stream',
+            pages=pages,
+            edge_tol=500,  # Increase edge tolerance
+            row_tol=10     # Adjust row tolerance if needed
+        )
+    except Exception as e:
+        print(f"Error extracting tables from pages {pages}: {str(e)}")
+        return []
+    return [(int(table.page), table.df.to_markdown()) for table in tables_list]
+
 
 class PDFExtractor:
     def __init__(self, pdf_path,workspace):
@@ -39,78 +167,152 @@ class PDFExtractor:
             pytesseract.pytesseract.tesseract_cmd = r'C:\\Users\\rajsu\\AppData\\Local\\Programs\\Tesseract-OCR\\tesseract.exe'
         
 
-    def extract_text(self):
-        text = {}
+    def extract_text(self, workers=None):
+        """
+        Extract text page by page, falling back to OCR for pages without a text layer,
+        and classify the document type from it.
+        """
+        text = self._extract_page_text(workers)
+        self.classify_document(text)
+        return text
+
+    def _extract_page_text(self, workers=None):
+        """
+        Page text only. With more than one worker the pages are spread over a process
+        pool in contiguous batches; the returned dict keeps page order either way.
+        """
+        workers = cfg.PDF_EXTRACT_WORKERS if workers is None else workers
         with pdfplumber.open(self.pdf_path) as pdf:
-            toal_pages = len(pdf.pages)
-            for i, page in enumerate(pdf.pages):
-                print(f"Extracting text from page {i+1}/{toal_pages}...")
-                # Try regular extraction first
-                page_text = page.extract_text()
-                if not page_text:
-                    # Fallback to OCR using Tesseract
-                    img = page.to_image(resolution=300)
-                    page_text = pytesseract.image_to_string(img.original)
-                text[f"page_{i+1}"] = page_text
+            total_pages = len(pdf.pages)
+
+        if workers > 1 and total_pages >= cfg.PDF_PARALLEL_MIN_PAGES:
+            text = self._extract_text_parallel(total_pages, workers)
+        else:
+            text = dict(_extract_pages_text(self.pdf_path, 1, total_pages, pytesseract.pytesseract.tesseract_cmd))
+        print("Text is extracted from the pdf")
+        return text
+
+    def classify_document(self, text):
+        """Ask Gemini for the document type from the start of the text"""
         qa_chain = QAChain()
         content_to_ask = str(text) if len(
             str(text)) < 2000 else str(text)[:2000]
         self.doc_type = qa_chain.give_document_type(content_to_ask)
-        print("Text is extracted from the pdf")
+        return self.doc_type
+
+    def _extract_text_parallel(self, total_pages, workers):
+        # Small batches keep the pool balanced when OCR pages are clustered together
+        batch_size = max(1, -(-total_pages // (workers * 4)))
+        ranges = [(start, min(start + batch_size - 1, total_pages))
+                  for start in range(1, total_pages + 1, batch_size)]
+        print(f"Extracting text from {total_pages} pages with {workers} processes...")
+
+        text = {}
+        # map() yields batches in submission order, so pages stay ordered
+        for batch in _map_in_pool(_extract_pages_text,
+                                  [self.pdf_path] * len(ranges),
+                                  [first for first, _ in ranges],
+                                  [last for _, last in ranges],
+                                  [pytesseract.pytesseract.tesseract_cmd] * len(ranges)):
+            text.update(batch)
         return text
 
-    def extract_tables(self):
+    def extract_tables(self, workers=None):
+        """
+        Extract tables with camelot in bulk. Pages are pre-screened with pdfplumber and
+        only candidate pages are handed to camelot, a batch of pages per read_pdf call
+        instead of one call (and one full PDF parse) per page.
+        """
         tables = {}
+        workers = cfg.PDF_EXTRACT_WORKERS if workers is None else workers
         try:
             with pdfplumber.open(self.pdf_path) as pdf:
                 total_pages = len(pdf.pages)
-            print(f"Extracting tables from {total_pages} pages...")
-
-            for page_num in range(1, total_pages + 1):
-                try:
-                    # Extract tables for the current page with adjusted parameters
-                    tables_list = camelot.read_pdf(
-                        self.pdf_path,
-                        flavor='stream',
-                        pages=str(page_num),
-                        edge_tol=500,  # Increase edge tolerance
-                        row_tol=10     # Adjust row tolerance if needed
-                    )
-                    if tables_list:
-                        for table in tables_list:
-                            key = f"page_{page_num}"
-                            # Append multiple tables from the same page
-                            if key in tables:
-                                tables[key] += "\n\n" + table.df.to_markdown()
-                            else:
-                                tables[key] = table.df.to_markdown()
-                
-                except Exception as e:
-                    print(
-                        f"Error extracting tables from page {page_num}: {str(e)}")
-                    continue
+                candidate_pages = [i + 1 for i, page in enumerate(pdf.pages) if _page_may_have_table(page)]
+            print(f"Extracting tables from {len(candidate_pages)}/{total_pages} candidate pages...")
+            if not candidate_pages:
+                return tables
+
+            batch_size = cfg.CAMELOT_PAGES_PER_BATCH
+            batches = [",".join(str(p) for p in candidate_pages[i:i + batch_size])
+                       for i in range(0, len(candidate_pages), batch_size)]
+
+            if workers > 1 and len(batches) > 1:
+                batch_results = _map_in_pool(_read_tables_batch,
+                                             [self.pdf_path] * len(batches),
+                                             batches,
+                                             [camelot.__ghostscript_path__] * len(batches))
+            else:
+                batch_results = [_read_tables_batch(self.pdf_path, pages, camelot.__ghostscript_path__)
+                                 for pages in batches]
+
+            for batch in batch_results:
+                for page_num, markdown in batch:
+                    key = f"page_{page_num}"
+                    # Append multiple tables from the same page
+                    if key in tables:
+                        tables[key] += "\n\n" + markdown
+                    else:
+                        tables[key] = markdown
             print("Tables are extracted from the pdf")
         except Exception as e:
             print(f"Error during table extraction: {str(e)}")
-        return tables
+        # Keep page order regardless of batch completion order
+        return dict(sorted(tables.items(), key=lambda item: int(item[0].split("_")[-1])))
 
-    def extract_images(self):
+    def extract_images(self, render_mode=None):
+        """
+        Page images keyed by page. In "eager" mode pages are rasterized in small batches
+        so only a few bitmaps are in memory at once. In "lazy" mode nothing is rendered
+        here; the paths are reserved and ensure_page_image() renders a page the first
+        time retrieval cites it.
+        """
+        render_mode = render_mode or cfg.PDF_RENDER_MODE
         images = {}
-        pages = convert_from_path(self.pdf_path, dpi=150)
-        print(f"Extracting {len(pages)} images from PDF...")
-        for i, page in enumerate(pages):
-            print(f"Saving image {i+1}...")
-            img_path = os.path.join(self.images_dir, f"page_{i+1}.jpg")
-            page.save(img_path, "JPEG")
-            images[f"page_{i+1}"] = img_path
+        total_pages = pdfinfo_from_path(self.pdf_path)["Pages"]
+        for page_num in range(1, total_pages + 1):
+            images[f"page_{page_num}"] = os.path.join(self.images_dir, f"page_{page_num}.jpg")
+
+        if render_mode == "lazy":
+            print(f"Deferred rendering of {total_pages} page images")
+            return images
+
+        print(f"Extracting {total_pages} images from PDF...")
+        batch_size = cfg.PDF_RENDER_BATCH_PAGES
+        for first_page in range(1, total_pages + 1, batch_size):
+            last_page = min(first_page + batch_size - 1, total_pages)
+            pages = convert_from_path(self.pdf_path, dpi=PAGE_IMAGE_DPI,
+                                      first_page=first_page, last_page=last_page)
+            for page_num, page in enumerate(pages, start=first_page):
+                print(f"Saving image {page_num}...")
+                page.save(images[f"page_{page_num}"], "JPEG")
+            del pages
         print("Images are extracted from the pdf")
         return images
 
-    def extract_all(self,extract_tables=True):  
+    def extract_all(self,extract_tables=True, timer=None):
+        """
+        Run the extraction stages, overlapping the independent ones: page images start
+        together with the text, and the Gemini document-type call runs while tables
+        are extracted. Stage durations are recorded on `timer` (a util.StageTimer).
+
+        Returns:
+            tuple: (data, json_path), the extraction and where it was persisted
+        """
+        timer = timer or StageTimer()
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="pdf-stage") as stages:
+            # Rasterization only needs the PDF, not the text
+            images_future = stages.submit(timer.run, "images", self.extract_images)
+            text = timer.run("text", self._extract_page_text)
+            doc_type_future = stages.submit(timer.run, "document_type", self.classify_document, text)
+            tables = timer.run("tables", self.extract_tables) if extract_tables else {}
+            images = images_future.result()
+            doc_type_future.result()
+
         data = {
-            "text": self.extract_text(),
-            "tables": self.extract_tables() if extract_tables else {},
-            "images": self.extract_images(),
+            "text": text,
+            "tables": tables,
+            "images": images,
             "metadata": {
                 "title": os.path.basename(self.pdf_path),
                 "timestamp": datetime.utcnow().isoformat(),
@@ -122,14 +324,17 @@ class PDFExtractor:
         print("pdf data is extracted")
         # Save to JSON
         json_path = os.path.join(self.output_dir, "extracted_data.json")
-        with open(json_path, "w") as f:
-            json.dump(data, f)
-        print("json_path::", json_path)
-        return json_path
 
+        def save():
+            with open(json_path, "w") as f:
+                json.dump(data, f)
+        timer.run("persist", save)
+        print("json_path::", json_path)
+        return data, json_path
 
 if __name__ == "__main__":
-    pdf_path = r"C:\Users\rajsu\Downloads\cp_plus_manual.pdf"
-    extractor = PDFExtractor(pdf_path)
-    json_path = extractor.extract_all(False)
+    import sys
+    pdf_path, workspace = sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else "default"
+    extractor = PDFExtractor(pdf_path, workspace)
+    data, json_path = extractor.extract_all(False)
     print(json_path)
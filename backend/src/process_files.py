@@ -1,9 +1,13 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pdf_extractor import PDFExtractor
 from sumarizer import Summarizer
 from database import Database
 from vector_store import VectorStore
 import uuid
+import threading
+import bisect
+import time
 import json
 import os
 from word_doc_extractor import WordExtractor
@@ -12,15 +16,43 @@ import json_functions as JC
 from image_processor import ImageProcessor
 from helper_functions import is_file_too_large,revert_fileAdded
 import util
+from util import StageTimer
 from logging_Setup import get_logger
 import config as cfg    
 from errorHandlers.fileManageErrorHandlers import FileSizeError, FileTypeError, FileAlreadyExistsError
 from gemini_direct import generate_image_title_dscrpt
+from answer_cache import answer_cache
+from content_store import content_store, file_sha256
+from chunker import get_chunker
+from metadata_store import docs_metadata
+from context_cache import context_cache
 
 logger=get_logger(__name__)
 
-def process_files(file_path, image_metadata=None, workspace_name=None, error_context=None):
+# Background workers for whole-document summaries
+_summary_pool = ThreadPoolExecutor(max_workers=cfg.SUMMARY_MAX_WORKERS, thread_name_prefix="doc-summary")
+
+def process_files(file_path, image_metadata=None, workspace_name=None, error_context=None, progress=None, timings=None):
+    """
+    Process an uploaded file into the vector store.
+    `progress`, if given, is called with the name of each stage as it starts.
+    `timings`, if given, is filled with the wall-clock seconds of each PDF/DOCX stage.
+    """
+    def report(stage):
+        if progress:
+            try:
+                progress(stage)
+            except Exception as e:
+                logger.warning(f"Progress callback failed at stage {stage}: {e}")
+
+    # Background summary of a PDF/DOCX, stopped again if the ingestion fails
+    summary_future, summary_abort = None, threading.Event()
+    # Content store reference held by this upload, released again if the ingestion fails
+    content_hash, content_ref_held = None, False
+    # What a PDF/DOCX ingestion has written so far, removed again if it fails
+    partial_document = None
     try:
+        report("checking")
         # Run pre-process checks first
         pre_process_check(file_path, workspace_name)
         
@@ -34,6 +66,7 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
             logger.info("Processing the image...")
             processor = ImageProcessor()
             image_metadata["workspace_name"]=workspace_name
+            report("processing_image")
             return processor.process_image(file_path, image_metadata or {})
         elif ext in [".txt", ".md"]:
             logger.info(f"Processing large TXT file: {file_path}")
@@ -41,46 +74,52 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
 
             # Get raw text and metadata directly from extractor
             logger.info("Getting raw content and metadata")
+            report("extracting")
             extracted_content = extractor.extract_all()
 
             full_content = extracted_content["text"]["content"]
             metadata=extracted_content["metadata"]
             metadata["workspace_name"]=workspace_name
 
-            # Split into chunks
-            logger.debug("Splitting text into chunks")
+            # Split into chunks on heading/paragraph/sentence boundaries, sized to the embedding model
             logger.info(f"Splitting {len(full_content)} characters into chunks")
-            chunk_size = 4000
-            chunks = [full_content[i:i+chunk_size]
-                      for i in range(0, len(full_content), chunk_size)]
+            text_chunks = get_chunker().split_text(full_content, markdown=(ext == ".md"))
+            if not text_chunks:
+                raise ValueError(f"No text found in {os.path.basename(file_path)}")
+            chunks = [chunk["text"] for chunk in text_chunks]
 
             vs = VectorStore()
             doc_id = str(uuid.uuid4())
 
-            # Process each chunk with shared metadata
+            # Build shared metadata for each chunk
             logger.info("Processing each chunk with shared metadata")
-            doc_id_list=[]
-            for idx, chunk in enumerate(chunks):
-                chunk_metadata = {
+            doc_id_list = [f"{doc_id}-{idx}" for idx in range(len(chunks))]
+            chunk_metadatas = []
+            for idx in range(len(chunks)):
+                chunk_metadatas.append({
                     "source": metadata["source"],
                     "title": metadata["title"],
                     "timestamp": metadata["timestamp"],
                     "document_type": metadata["document_type"],
                     "chunk": idx+1,
                     "total_chunks": len(chunks),
+                    # Offsets into the file, consecutive chunks overlap
+                    "char_start": text_chunks[idx]["start"],
+                    "char_end": text_chunks[idx]["end"],
                     "workspace_name":metadata["workspace_name"]
-                }
+                })
 
-                # Generate embeddings for each chunk
-                logger.debug(f"Generating embeddings for chunk {idx+1}/{len(chunks)}")
-                embedding = Summarizer().generate_embeddings(chunk)
-                vs.add_embedding(
-                    doc_id=f"{doc_id}-{idx}",
-                    embedding=embedding,
-                    text=chunk,
-                    metadata=chunk_metadata
-                )
-                doc_id_list.append(f"{doc_id}-{idx}")
+            # Generate embeddings for all chunks in one batched call
+            logger.debug(f"Generating embeddings for {len(chunks)} chunks")
+            report("embedding")
+            embeddings = Summarizer().generate_embeddings_batch(chunks)
+            report("indexing")
+            vs.add_text_embeddings(
+                doc_ids=doc_id_list,
+                embeddings=embeddings,
+                texts=chunks,
+                metadatas=chunk_metadatas
+            )
 
             logger.info(f"Processed TXT file into {len(chunks)} chunks")
             #Saving the text metadata in docs_metadata.json
@@ -99,35 +138,58 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
             else:
                 raise ValueError(f"Unsupported file type: {ext}")
 
-            json_path = extractor.extract_all(extract_tables=False)  #extract_tables=False if isLargeFile else True
-
-            # Generate Summary & Embeddings
-            with open(json_path, "r") as f:
-                data = json.load(f)
-            metadata_lines = [
-                # Explicit source line
-                f"source: {data['metadata']['source']}",
-                f"title: {data['metadata']['title']}",
-                f"timestamp: {data['metadata']['timestamp']}",
-                f"document_type:{data['metadata']['document_type']}",
-                f"workspace_name:{workspace_name}"
-            ]
-            
-            full_text = " ".join(data["text"].values()) + \
-                "\n\nMetadata:\n" + "\n".join(metadata_lines)
+            timer = StageTimer()
 
-            logger.debug("Generating summary and embeddings")
-            summarizer = Summarizer()
-            summary = summarizer.generate_summary(full_text)
-            embedding = summarizer.generate_embeddings(summary)
+            # Byte-identical files reuse the stored extraction and embeddings
+            content_hash = timer.run("hash", file_sha256, file_path) if cfg.CONTENT_DEDUP else None
+            cached = content_store.acquire(content_hash) if content_hash else None
+            content_ref_held = cached is not None
+
+            if cached:
+                logger.info(f"Content {content_hash} already ingested, linking existing artifacts")
+                report("linking")
+                data, json_path = timer.run("link", _link_cached_extraction, cached["data"], extractor, file_path, ext)
+            else:
+                report("extracting")
+                # The extractor hands back what it persisted, no need to read it again
+                data, json_path = timer.run("extract", extractor.extract_all,
+                                            extract_tables=cfg.EXTRACT_TABLES, timer=timer)
+
+            # The summary only needs the extracted text, generate it while we chunk, embed and index
+            if cfg.SUMMARIZE_DOCUMENTS:
+                summary_future = _summary_pool.submit(
+                    _summarize_document, data, workspace_name, content_hash, summary_abort)
+
+            # Chunk by page (PDF) or paragraph group (DOCX) so retrieval returns only relevant parts
+            if ext == '.pdf':
+                chunks = timer.run("chunk", _pdf_page_chunks, data)
+            else:
+                chunks = timer.run("chunk", _docx_paragraph_chunks, data)
+            if not chunks:
+                raise ValueError(f"No text could be extracted from {os.path.basename(file_path)}")
+            texts = [chunk["text"] for chunk in chunks]
+
+            # Stored embeddings are only valid if chunking produced the same texts
+            embeddings = None
+            if cached and cached["chunk_texts"] == texts:
+                embeddings = cached["embeddings"]
 
             # Store Data
             doc_id = str(uuid.uuid4())
+            doc_id_list = [f"{doc_id}-{idx}" for idx in range(len(chunks))]
+            partial_document = {
+                "doc_id": doc_id,
+                "chunk_ids": doc_id_list,
+                "json_path": json_path,
+                "file_name": os.path.basename(file_path)
+            }
             db = Database()
-            db.insert_document(doc_id, data["metadata"]["title"], workspace_name,
-                               data["metadata"]["timestamp"], json_path)
+            try:
+                timer.run("db_insert", db.insert_document, doc_id, data["metadata"]["title"], workspace_name,
+                          data["metadata"]["timestamp"], json_path)
+            finally:
+                db.conn.close()
 
-            vs = VectorStore()
             metadata_dict = {
                 "source": f"{data['metadata']['source']}",
                 "title": f"{data['metadata']['title']}",
@@ -135,19 +197,56 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
                 "document_type": f"{data['metadata']['document_type']}",
                 "workspace_name": workspace_name
             }
-            vs.add_embedding(
-                doc_id=doc_id,
-                embedding=embedding,
-                text=summary,
-                metadata=metadata_dict
+            chunk_metadatas = []
+            for idx, chunk in enumerate(chunks):
+                chunk_metadata = dict(metadata_dict)
+                chunk_metadata.update(chunk["metadata"])
+                chunk_metadata["parent_doc_id"] = doc_id
+                chunk_metadata["total_chunks"] = len(chunks)
+                chunk_metadatas.append(chunk_metadata)
+
+            reused_embeddings = embeddings is not None
+            if not reused_embeddings:
+                logger.debug(f"Generating embeddings for {len(chunks)} chunks")
+                report("embedding")
+                embeddings = timer.run("embed", Summarizer().generate_embeddings_batch, texts)
+            report("indexing")
+            vs = VectorStore()
+            timer.run("index", vs.add_text_embeddings,
+                doc_ids=doc_id_list,
+                embeddings=embeddings,
+                texts=texts,
+                metadatas=chunk_metadatas
             )
-            logger.info(f"Processed {ext} file into {doc_id}")
+
+            # A cache hit already holds its reference from acquire(), new artifacts take one when stored
+            if content_hash and not reused_embeddings:
+                timer.run("store", content_store.save, content_hash, ext, data, texts, embeddings,
+                          data_path=json_path, take_ref=not content_ref_held)
+                content_ref_held = True
+            logger.info(f"Processed {ext} file into {len(chunks)} chunks of {doc_id}")
+
+            summary_id = f"{doc_id}-summary"
+            # Snapshot the metadata, the dict below gets list values Chroma can't store
+            summary_metadata = dict(metadata_dict)
+
             file_name = os.path.basename(file_path)
             metadata_dict["output_path"]=f"media/output/{file_name}"
-            metadata_dict["doc_id"]=doc_id
+            metadata_dict["doc_id"]=doc_id_list + [summary_id]
+            metadata_dict["parent_doc_id"]=doc_id
+            metadata_dict["content_hash"]=content_hash
             #Saving the text metadata in docs_metadata.json
-            JC._update_DOCX_metadata_file(file_name, metadata_dict)
-            return doc_id
+            timer.run("metadata", JC._update_DOCX_metadata_file, file_name, metadata_dict)
+
+            # The summary vector is added once both the summary and the document are in place
+            if summary_future is not None:
+                summary_future.add_done_callback(
+                    lambda future: _index_document_summary(doc_id, summary_id, future, summary_metadata))
+
+            logger.info(f"Ingestion timings for {file_name}: {timer.summary()}")
+            if timings is not None:
+                timings.update(timer.as_dict())
+            return doc_id_list
     
     except (FileSizeError, FileTypeError) as e:
         logger.error(f"Cannot process file: {str(e)}")
@@ -159,7 +258,7 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
                 "exception": e,
                 "location": "pre_process_check"
             }
-        revert_fileAdded(file_path)
+        revert_fileAdded(file_path, workspace_name)
         return None
     except FileAlreadyExistsError as e:
         logger.warning(f"Cannot process file: {str(e)}")
@@ -174,6 +273,15 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
         return None
     except Exception as e:
         logger.error(f"Error occurred while adding file: {e}")
+        # Don't spend Gemini quota on a summary nobody will index
+        _abort_summary(summary_future, summary_abort)
+        if partial_document is not None:
+            _discard_partial_document(**partial_document)
+        if content_ref_held:
+            try:
+                content_store.release(content_hash)
+            except Exception as release_error:
+                logger.error(f"Releasing content {content_hash} failed: {release_error}")
         
         # Store error details if context object provided
         if error_context is not None:
@@ -184,10 +292,194 @@ def process_files(file_path, image_metadata=None, workspace_name=None, error_con
             }
             
         # Cleanup code...
-        revert_fileAdded(file_path) 
+        revert_fileAdded(file_path, workspace_name) 
         return None
 
 
+
+def _pdf_page_chunks(data, chunker=None):
+    """
+    Chunks of each non-empty PDF page (with that page's tables), sized to the embedding
+    model. Every chunk keeps its page number and page image reference.
+    """
+    chunker = chunker or get_chunker()
+    chunks = []
+    tables = data.get("tables", {}) or {}
+    images = data.get("images", {}) or {}
+    for page_key, page_text in data["text"].items():
+        text = (page_text or "").strip()
+        if tables.get(page_key):
+            text = f"{text}\n\n{tables[page_key]}".strip()
+        if not text:
+            continue
+        page_chunks = chunker.split_text(text)
+        for part, page_chunk in enumerate(page_chunks):
+            chunk_metadata = {
+                "chunk_type": "page",
+                "page": int(page_key.split("_")[-1]),
+                "page_part": part + 1,
+                "page_parts": len(page_chunks),
+            }
+            if images.get(page_key):
+                chunk_metadata["page_image"] = images[page_key]
+            chunks.append({"text": page_chunk["text"], "metadata": chunk_metadata})
+    return chunks
+
+
+def _docx_paragraph_chunks(data, chunker=None):
+    """Group consecutive DOCX paragraphs into chunks sized to the embedding model"""
+    chunker = chunker or get_chunker()
+    chunks = []
+
+    # Paragraphs become blank-line separated blocks, offsets map chunks back to paragraphs
+    paragraphs, starts, pos = [], [], 0
+    for para_key, para_text in data["text"].items():
+        text = (para_text or "").strip()
+        if not text:
+            continue
+        paragraphs.append((int(para_key.split("_")[-1]), text))
+        starts.append(pos)
+        pos += len(text) + 2
+    full_text = "\n\n".join(text for _, text in paragraphs)
+
+    for chunk in chunker.split_text(full_text):
+        first = bisect.bisect_right(starts, chunk["start"]) - 1
+        last = bisect.bisect_right(starts, chunk["end"] - 1) - 1
+        chunks.append({
+            "text": chunk["text"],
+            "metadata": {
+                "chunk_type": "paragraphs",
+                "paragraph_start": paragraphs[first][0],
+                "paragraph_end": paragraphs[last][0],
+            }
+        })
+
+    # Tables are not tied to a paragraph, index them as their own chunks
+    for table_key, table in (data.get("tables", {}) or {}).items():
+        if table:
+            for part, table_chunk in enumerate(chunker.split_text(str(table))):
+                chunks.append({
+                    "text": table_chunk["text"],
+                    "metadata": {"chunk_type": "table", "table": table_key, "table_part": part + 1}
+                })
+    return chunks
+
+
+def _link_cached_extraction(cached_data, extractor, file_path, ext):
+    """
+    Write a copy of a stored extraction into this upload's output directory, pointing
+    its metadata and image paths at the new file. PDF page images are rendered lazily
+    on first citation, DOCX images are re-read from the archive (no OCR or LLM calls).
+    """
+    data = json.loads(json.dumps(cached_data))
+    data["metadata"].update({
+        "title": os.path.basename(file_path),
+        "timestamp": datetime.utcnow().isoformat(),
+        "source": file_path,
+        "full_path": file_path,
+    })
+    if ext == '.pdf':
+        data["images"] = {
+            page_key: os.path.join(extractor.images_dir, f"{page_key}.jpg")
+            for page_key in data["text"]
+        }
+    else:
+        data["images"] = extractor.extract_images()
+
+    json_path = os.path.join(extractor.output_dir, "extracted_data.json")
+    with open(json_path, "w") as f:
+        json.dump(data, f)
+    return data, json_path
+
+
+def _discard_partial_document(doc_id, chunk_ids, json_path, file_name):
+    """
+    Undo what a failed PDF/DOCX ingestion already wrote, so the document is not left
+    half retrievable and a re-upload doesn't add a second set of chunks. Best effort,
+    every step runs even if an earlier one fails.
+    """
+    def delete_document_row():
+        with Database() as db:
+            db.delete_doc(doc_id)
+
+    steps = [
+        # Also drops the rows from the BM25 index
+        ("vector rows", lambda: VectorStore().delete_from_text_collection(chunk_ids)),
+        ("documents row", delete_document_row),
+        ("metadata record", lambda: docs_metadata.pop(
+            file_name, predicate=lambda entry: entry.get("parent_doc_id") == doc_id)),
+        ("context cache", lambda: context_cache.invalidate(json_path)),
+    ]
+    for what, step in steps:
+        try:
+            step()
+        except Exception as e:
+            logger.error(f"Cleaning up the {what} of failed document {doc_id} failed: {e}")
+    logger.info(f"Removed partial ingestion of {file_name} ({doc_id})")
+
+
+def _abort_summary(summary_future, summary_abort):
+    """Stop the background summary of a document whose ingestion failed"""
+    if summary_future is None:
+        return
+    summary_abort.set()
+    if summary_future.cancel():
+        logger.info("Cancelled the pending summary of the failed document")
+    else:
+        logger.info("Stopping the running summary of the failed document")
+
+
+def _summarize_document(data, workspace_name, content_hash=None, abort=None):
+    """
+    Summarize the document body, returns (summary text, embedding). Runs on _summary_pool.
+    The Summarizer caches by content_hash, so a re-uploaded file is never summarized twice.
+    Per-upload metadata (path, title, workspace) is added to the indexed text afterwards,
+    the cached summary only ever depends on the file's content.
+    Setting `abort` stops it before the next Gemini call, nothing is cached then.
+    """
+    start_time = time.perf_counter()
+    body = " ".join(value for value in data["text"].values() if value)
+
+    summarizer = Summarizer()
+    summary = summarizer.generate_summary(body, content_hash=content_hash, cancel_event=abort)
+
+    metadata_lines = [
+        # Explicit source line
+        f"source: {data['metadata']['source']}",
+        f"title: {data['metadata']['title']}",
+        f"timestamp: {data['metadata']['timestamp']}",
+        f"document_type:{data['metadata']['document_type']}",
+        f"workspace_name:{workspace_name}"
+    ]
+    summary_text = f"{summary}\n\nMetadata:\n" + "\n".join(metadata_lines)
+    embedding = summarizer.generate_embeddings(summary_text)
+    logger.info(f"Summarized {data['metadata']['title']} in {time.perf_counter() - start_time:.2f}s")
+    return summary_text, embedding
+
+
+def _index_document_summary(doc_id, summary_id, summary_future, metadata_dict):
+    """Index the finished summary as one extra vector of the document, run off the request path"""
+    try:
+        summary, embedding = summary_future.result()
+
+        # The document may have been deleted while we were summarizing
+        db = Database()
+        try:
+            if not db.get_contentPath_fromDocument(doc_id):
+                logger.info(f"Document {doc_id} was removed before its summary was ready, skipping")
+                return
+        finally:
+            db.conn.close()
+
+        summary_metadata = dict(metadata_dict)
+        summary_metadata["chunk_type"] = "summary"
+        summary_metadata["parent_doc_id"] = doc_id
+        VectorStore().add_many([summary_id], [embedding], [summary], [summary_metadata])
+        logger.info(f"Indexed summary for document {doc_id}")
+    except Exception as e:
+        logger.error(f"Background summary failed for {doc_id}: {str(e)}")
+
+
 def pre_process_check(file_path, workspace_name=None):
     """
     Check if the file is too large(>10mb), supports allowed extensions only and not already exists before process.
@@ -233,7 +525,7 @@ def pre_process_check(file_path, workspace_name=None):
         logger.error(f"Unexpected error in pre-process check: {str(e)}")
         raise Exception(f"Error checking file: {str(e)}")
 
-def process_files_api(file_path, image_metadata=None, workspace_name=None):
+def process_files_api(file_path, image_metadata=None, workspace_name=None, progress=None):
     """API-friendly method to process files of various types."""
     try:
         # Check if file_path is None or empty
@@ -266,10 +558,12 @@ def process_files_api(file_path, image_metadata=None, workspace_name=None):
         error_context = {"error_occurred": False, "error_details": None}
         
         # Pass error context to process_files
-        doc_id = process_files(full_path, image_metadata, workspace_name, error_context)
+        timings = {}
+        doc_id = process_files(full_path, image_metadata, workspace_name, error_context, progress, timings)
         
         if doc_id:
-            # Success case - file was processed
+            # Success case - file was processed, earlier answers didn't know about it
+            answer_cache.invalidate_workspace(workspace_name)
             file_name = os.path.basename(full_path)
             file_ext = os.path.splitext(full_path)[1].lower()
             
@@ -281,7 +575,8 @@ def process_files_api(file_path, image_metadata=None, workspace_name=None):
                     "file_name": file_name,
                     "file_type": file_ext,
                     "workspace": workspace_name,
-                    "timestamp": datetime.now().isoformat()
+                    "timestamp": datetime.now().isoformat(),
+                    "timings": timings
                 }
             }
         else:
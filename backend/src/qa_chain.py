@@ -1,4 +1,5 @@
 import io
+import itertools
 from langchain.chains import RetrievalQA
 from langchain_google_genai import GoogleGenerativeAI
 from tenacity import retry, wait_exponential_jitter, stop_after_attempt
@@ -8,34 +9,105 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 import config as cfg
+from rate_limiter import gemini_limiter, estimate_tokens
 media_output_dir=cfg.OUTPUT_DIR
 base_url=cfg.BASE_URL
 upoad_dir=cfg.UPLOAD_DIR
 
+LLM_ERROR_ANSWER = "I'm having trouble accessing the AI service. Please try again later."
+
+class LineDeduplicator:
+    """
+    Incremental version of the answer line dedup: empty lines and lines repeating an
+    earlier one (case/whitespace-insensitive) are dropped, kept lines are joined by newlines.
+    Text is released as soon as the current line can no longer turn out to be a duplicate,
+    so streamed answers don't wait for a full line before showing anything.
+    """
+
+    def __init__(self):
+        self.seen = set()
+        self.pending = ""       # current, not yet finished line
+        self.committed = False  # pending line already known to be unique and partly emitted
+        self.emitted_lines = 0
+
+    def _separator(self):
+        return "\n" if self.emitted_lines else ""
+
+    def _may_repeat(self, prefix):
+        return any(line.startswith(prefix) for line in self.seen)
+
+    def _finish_line(self):
+        clean_line = self.pending.strip().lower()
+        out = ""
+        if self.committed:
+            self.seen.add(clean_line)
+            self.emitted_lines += 1
+        elif clean_line and clean_line not in self.seen:
+            self.seen.add(clean_line)
+            out = self._separator() + self.pending
+            self.emitted_lines += 1
+        self.pending = ""
+        self.committed = False
+        return out
+
+    def feed(self, text):
+        """Add streamed text, returns the part of it that can be shown now"""
+        out = []
+        parts = text.split("\n")
+        for idx, part in enumerate(parts):
+            if self.committed:
+                out.append(part)
+            self.pending += part
+            if idx < len(parts) - 1:
+                out.append(self._finish_line())
+            elif not self.committed:
+                # Every later version of this line starts with prefix once cleaned
+                prefix = self.pending.strip().lower()
+                if prefix and not self._may_repeat(prefix):
+                    out.append(self._separator() + self.pending)
+                    self.committed = True
+        return "".join(out)
+
+    def flush(self):
+        """End of stream, returns whatever of the last line should still be shown"""
+        return self._finish_line()
+
+
+def dedupe_lines(text):
+    deduper = LineDeduplicator()
+    return deduper.feed(text) + deduper.flush()
+
+
 class QAChain:
     def __init__(self):
         self.llm = GoogleGenerativeAI(
             model="gemini-2.0-flash",  
             temperature=0,
-            max_retries=5,  # Explicit retries
+            max_retries=1,  # Retries happen in _safe_llm_call, behind the shared limiter
             request_timeout=30, # Timeout in seconds
             api_key=os.environ.get("GEMINI_API_KEY")
         )
         self.model = self.llm
-        self.last_call_time = 0
 
     @retry(wait=wait_exponential_jitter(initial=2, max=60),
            stop=stop_after_attempt(5),
            reraise=True)
     def _safe_llm_call(self, messages):
-        # Enforce rate limiting
-        elapsed = time.time() - self.last_call_time
-        if elapsed < 1.2:  # 50 RPM limit (1.2s between calls)
-            time.sleep(1.2 - elapsed)
-
-        return self.llm.invoke(messages)
+        # Every attempt, retries included, waits for the process-wide Gemini budget
+        with gemini_limiter.limit(messages):
+            return self.llm.invoke(messages)
 
     def generate_answer(self, context_list, question):
+        prompt = self._build_answer_prompt(context_list, question)
+        try:
+            # return self.llm.invoke(prompt)
+            answer = self._safe_llm_call([prompt])
+            return dedupe_lines(answer)
+        except Exception as e:
+            print(f"LLM Error: {str(e)}")
+            return LLM_ERROR_ANSWER
+
+    def _build_answer_prompt(self, context_list, question):
         # Extract image paths from context
         image_paths = []
         context_text = ""
@@ -82,23 +154,20 @@ class QAChain:
         with Proper spacing and structure,Nice formatting like bold, italics, bullet points, etc. 
         and Meaningful and fun emojis where they make sense.
         """
+        return prompt
+
+    def generate_answer_image(self, context_list, question):
+        prompt = self._build_image_answer_prompt(context_list, question)
         try:
-            # return self.llm.invoke(prompt)
+            # Pass formatted message to Gemini
             answer = self._safe_llm_call([prompt])
-            seen = set()
-            deduped_lines = []
-            for line in answer.split('\n'):
-                clean_line = line.strip().lower()
-                if clean_line and clean_line not in seen:
-                    seen.add(clean_line)
-                    deduped_lines.append(line)
-
-            return "\n".join(deduped_lines)
+            return dedupe_lines(answer)
+
         except Exception as e:
-            print(f"LLM Error: {str(e)}")
-            return "I'm having trouble accessing the AI service. Please try again later."
+            print(f"Image analysis error: {str(e)}")
+            return LLM_ERROR_ANSWER
 
-    def generate_answer_image(self, context_list, question):
+    def _build_image_answer_prompt(self, context_list, question):
         # Extract image paths and text context
         image_paths = []
         text_context = []
@@ -147,24 +216,40 @@ class QAChain:
         Asnwer with short description and reference to image path like this :[Image: Path of source].
         And Do not repeat your same answer.
         """
+        return prompt
 
-        try:
-            # Pass formatted message to Gemini
-            answer = self._safe_llm_call([prompt])
-
-            seen = set()
-            deduped_lines = []
-            for line in answer.split('\n'):
-                clean_line = line.strip().lower()
-                if clean_line and clean_line not in seen:
-                    seen.add(clean_line)
-                    deduped_lines.append(line)
-
-            return "\n".join(deduped_lines)
+    @retry(wait=wait_exponential_jitter(initial=2, max=60),
+           stop=stop_after_attempt(5),
+           reraise=True)
+    def _open_llm_stream(self, messages):
+        """
+        Start a streamed generation and wait for its first chunk.
+        Only this part is retried, once text has reached the client a retry would repeat it.
+        """
+        with gemini_limiter.limit(messages):
+            stream = iter(self.llm.stream(messages))
+            first_chunk = next(stream, "")
+        return first_chunk, stream
 
-        except Exception as e:
-            print(f"Image analysis error: {str(e)}")
-            return "I'm having trouble accessing the AI service. Please try again later."
+    def stream_answer(self, context_list, question, search_type="text"):
+        """
+        Generator version of generate_answer / generate_answer_image.
+        Yields deduplicated answer text as Gemini produces it.
+        """
+        if search_type == "image":
+            prompt = self._build_image_answer_prompt(context_list, question)
+        else:
+            prompt = self._build_answer_prompt(context_list, question)
+
+        deduper = LineDeduplicator()
+        first_chunk, stream = self._open_llm_stream([prompt])
+        for chunk in itertools.chain([first_chunk], stream):
+            text = deduper.feed(chunk)
+            if text:
+                yield text
+        text = deduper.flush()
+        if text:
+            yield text
 
     # it is same like generate_answer_image but it add the images to process
     def generate_answer_image_V2(self, context_list, question):
@@ -274,7 +359,9 @@ class QAChain:
         Context: {str(context)[:2000]}
         """
         try:
-            response = self.llm.invoke(prompt)
+            # No retries here, grading runs against a deadline
+            with gemini_limiter.limit(prompt, tokens=estimate_tokens(prompt, output_tokens=1)):
+                response = self.llm.invoke(prompt)
             return float(response.strip()) if response.strip().isdigit() else 0.0
         except Exception as e:
             print(f"LLM Error: {str(e)}")
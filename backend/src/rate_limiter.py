@@ -0,0 +1,198 @@
+"""
+Shared token-bucket limiter for every Gemini call.
+Two buckets are enforced together: requests per minute and tokens per minute.
+Optionally the bucket state lives in a small locked file so several worker processes
+share one budget. A 429 from Gemini pauses the whole bucket for a cooldown instead of
+letting every retrying caller hammer the API again.
+"""
+
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+import config as cfg
+from logging_Setup import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows, cross-process sharing is not available
+    fcntl = None
+
+logger = get_logger(__name__)
+
+CHARS_PER_TOKEN = 4
+IMAGE_TOKENS = 258  # Gemini's flat cost for an inline image
+
+
+def estimate_tokens(payload, output_tokens=cfg.GEMINI_OUTPUT_TOKEN_ESTIMATE):
+    """Rough token count of a prompt (str, list of messages or message dicts) plus the expected output"""
+    def count(item):
+        if isinstance(item, str):
+            return len(item) // CHARS_PER_TOKEN + 1
+        if isinstance(item, (bytes, bytearray)):
+            return IMAGE_TOKENS
+        if isinstance(item, dict):
+            return sum(count(value) for value in item.values())
+        if isinstance(item, (list, tuple)):
+            return sum(count(value) for value in item)
+        return 0
+    return count(payload) + output_tokens
+
+
+def is_rate_limit_error(error):
+    """True for Gemini quota errors, whichever client library raised them"""
+    text = f"{type(error).__name__} {error}"
+    return "429" in text or "ResourceExhausted" in text or "RESOURCE_EXHAUSTED" in text
+
+
+class TokenBucketLimiter:
+    def __init__(self, rpm, tpm=None, burst=None, cooldown_sec=0.0, state_file=None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.request_capacity = max(1, burst or rpm or 1)
+        self.cooldown_sec = cooldown_sec
+        self.state_file = state_file if state_file and fcntl is not None else None
+        self._lock = threading.Lock()
+        self._state = {
+            "requests": float(self.request_capacity),
+            "tokens": float(tpm or 0),
+            "updated": time.time(),
+            "blocked_until": 0.0
+        }
+        # Metrics
+        self.acquired = 0
+        self.throttled = 0
+        self.rate_limited = 0
+        self.waiting = 0
+        self.total_wait_sec = 0.0
+        self.max_wait_sec = 0.0
+
+    @contextmanager
+    def _state_locked(self):
+        """Thread lock, plus the state file and its OS lock when the bucket is shared"""
+        with self._lock:
+            if self.state_file is None:
+                yield self._state
+                return
+            os.makedirs(os.path.dirname(self.state_file) or ".", exist_ok=True)
+            with open(self.state_file, "a+") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or "null") or dict(self._state)
+                    except json.JSONDecodeError:
+                        state = dict(self._state)
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated"])
+        state["requests"] = min(self.request_capacity, state["requests"] + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            state["tokens"] = min(self.tpm, state["tokens"] + elapsed * self.tpm / 60.0)
+        state["updated"] = now
+
+    def _try_take(self, tokens):
+        """Take one request and `tokens` tokens if available, else return the seconds to wait"""
+        with self._state_locked() as state:
+            now = time.time()
+            self._refill(state, now)
+            if now < state["blocked_until"]:
+                return state["blocked_until"] - now
+
+            wait = 0.0
+            if state["requests"] < 1:
+                wait = (1 - state["requests"]) * 60.0 / self.rpm
+            if self.tpm and state["tokens"] < tokens:
+                wait = max(wait, (tokens - state["tokens"]) * 60.0 / self.tpm)
+            if wait > 0:
+                return wait
+
+            state["requests"] -= 1
+            if self.tpm:
+                state["tokens"] -= tokens
+            return 0.0
+
+    def acquire(self, tokens=0):
+        """Block until one request using roughly `tokens` tokens fits in both budgets"""
+        if not self.rpm:
+            return
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        start_time = time.monotonic()
+        with self._lock:
+            self.waiting += 1
+        throttled = False
+        try:
+            while True:
+                wait = self._try_take(tokens)
+                if wait <= 0:
+                    break
+                throttled = True
+                # Re-check at least every second, another process may have changed the state
+                time.sleep(min(wait, 1.0))
+        finally:
+            waited = time.monotonic() - start_time
+            with self._lock:
+                self.waiting -= 1
+                self.acquired += 1
+                self.throttled += int(throttled)
+                self.total_wait_sec += waited
+                self.max_wait_sec = max(self.max_wait_sec, waited)
+
+    def report_rate_limited(self):
+        """Gemini answered 429, hold every caller back for the cooldown"""
+        with self._lock:
+            self.rate_limited += 1
+        with self._state_locked() as state:
+            state["blocked_until"] = max(state["blocked_until"], time.time() + self.cooldown_sec)
+            state["requests"] = 0.0
+        logger.warning(f"Gemini rate limit hit, pausing calls for {self.cooldown_sec}s")
+
+    @contextmanager
+    def limit(self, payload=None, tokens=None):
+        """
+        Acquire before a Gemini call and watch it for 429s:
+
+            with gemini_limiter.limit(prompt):
+                response = model.generate_content(prompt)
+        """
+        self.acquire(estimate_tokens(payload) if tokens is None else tokens)
+        try:
+            yield
+        except Exception as e:
+            if is_rate_limit_error(e):
+                self.report_rate_limited()
+            raise
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "burst": self.request_capacity,
+                "shared_state_file": self.state_file,
+                "acquired": self.acquired,
+                "throttled": self.throttled,
+                "rate_limited": self.rate_limited,
+                "waiting": self.waiting,
+                "total_wait_sec": round(self.total_wait_sec, 3),
+                "avg_wait_sec": round(self.total_wait_sec / self.acquired, 3) if self.acquired else 0.0,
+                "max_wait_sec": round(self.max_wait_sec, 3)
+            }
+
+
+# Shared limiter for Gemini calls
+gemini_limiter = TokenBucketLimiter(
+    rpm=cfg.GEMINI_RPM,
+    tpm=cfg.GEMINI_TPM,
+    burst=cfg.GEMINI_BURST,
+    cooldown_sec=cfg.GEMINI_RATE_LIMIT_COOLDOWN_SEC,
+    state_file=cfg.GEMINI_LIMITER_STATE_FILE
+)
@@ -0,0 +1,68 @@
+"""
+Concurrent relevance grading of retrieved contexts.
+Every request grades its contexts on its own small thread pool, so N hits cost roughly
+one LLM round trip instead of N sequential ones. The pool is per request so one busy
+request can't queue the others' graders past their deadline; the total Gemini load is
+bounded by the shared rate limiter QAChain goes through.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+import config as cfg
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+def _grade_one(grader, context, question, limiter):
+    if limiter is not None:
+        limiter.acquire()
+    return grader.validate_context_relevance(context, question)
+
+
+def grade_contexts(grader, contexts, question, deadline_sec=None, limiter=None):
+    """
+    Grade all contexts concurrently.
+
+    Args:
+        grader: Object with validate_context_relevance(context, question), normally a QAChain
+        contexts (list): Contexts to grade
+        question (str): The user question
+        deadline_sec (float): Time budget for the whole batch, defaults to cfg.RELEVANCE_DEADLINE_SEC
+        limiter: Extra limiter acquired before each call. QAChain already goes
+            through the shared Gemini limiter itself, so this is None by default
+
+    Returns:
+        list: One score per context, in input order. None means the grader did not
+        finish before the deadline (relevance unknown).
+    """
+    if not contexts:
+        return []
+    deadline_sec = cfg.RELEVANCE_DEADLINE_SEC if deadline_sec is None else deadline_sec
+
+    pool = ThreadPoolExecutor(
+        max_workers=max(1, min(len(contexts), cfg.RELEVANCE_MAX_WORKERS)),
+        thread_name_prefix="relevance-grader"
+    )
+    futures = [
+        pool.submit(_grade_one, grader, context, question, limiter)
+        for context in contexts
+    ]
+    done, not_done = wait(futures, timeout=deadline_sec)
+    # Graders still queued are dropped, running ones finish in the background
+    pool.shutdown(wait=False, cancel_futures=True)
+
+    scores = []
+    for future in futures:
+        if future in not_done:
+            # Don't block the answer on a slow grader
+            scores.append(None)
+            continue
+        try:
+            scores.append(future.result())
+        except Exception as e:
+            logger.error(f"Relevance grading failed: {str(e)}")
+            scores.append(0.0)  # Same fallback as validate_context_relevance
+
+    if not_done:
+        logger.warning(f"{len(not_done)}/{len(futures)} relevance graders missed the {deadline_sec}s deadline")
+    return scores
+
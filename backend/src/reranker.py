@@ -0,0 +1,78 @@
+"""
+Local cross-encoder reranking of retrieved contexts.
+Alternative to the Gemini relevance prompt: all candidates are scored in one CPU batch,
+so filtering costs tens of milliseconds and no API quota.
+"""
+
+import numpy as np
+import torch
+import config as cfg
+from embedding_model import model_registry
+from logging_Setup import get_logger
+
+logger = get_logger(__name__)
+
+RELEVANCE_MODES = ("llm", "reranker")
+LLM_RELEVANCE_THRESHOLD = 0.7
+
+
+def context_to_text(context, max_chars=2000):
+    """Flatten a context dict into the passage text the cross-encoder reads"""
+    parts = []
+    metadata = context.get("metadata", {}) or {}
+    if metadata.get("title"):
+        parts.append(f"Title: {metadata['title']}")
+
+    text = context.get("text", "")
+    if isinstance(text, dict):
+        text = "\n".join(str(value) for value in text.values() if value)
+    if text:
+        parts.append(str(text))
+
+    tables = context.get("tables", {}) or {}
+    if tables:
+        parts.append("\n".join(str(table) for table in tables.values()))
+
+    if metadata.get("extracted_text") and metadata.get("extracted_text") not in parts:
+        parts.append(str(metadata["extracted_text"]))
+
+    return "\n".join(parts)[:max_chars]
+
+
+class CrossEncoderReranker:
+    def __init__(self, threshold=None, batch_size=None, registry=None):
+        self.threshold = cfg.RERANKER_THRESHOLD if threshold is None else threshold
+        self.batch_size = batch_size or cfg.RERANKER_BATCH_SIZE
+        self.registry = registry or model_registry
+
+    def score(self, contexts, question):
+        """
+        Score every context against the question in one batch.
+
+        Returns:
+            list[float]: Sigmoid-calibrated relevance in [0, 1], in input order
+        """
+        if not contexts:
+            return []
+        model = self.registry.get_reranker_model()
+        pairs = [(question, context_to_text(context)) for context in contexts]
+        logits = np.asarray(model.predict(
+            pairs,
+            batch_size=self.batch_size,
+            activation_fn=torch.nn.Identity(),  # raw logits, calibrated below
+            convert_to_numpy=True,
+            show_progress_bar=False
+        ), dtype=np.float32).reshape(-1)
+        return (1.0 / (1.0 + np.exp(-logits))).tolist()
+
+    def is_relevant(self, score):
+        return score > self.threshold
+
+
+def resolve_relevance_mode(relevance_mode=None):
+    """Validate a per-request relevance mode, falling back to cfg.RELEVANCE_MODE"""
+    mode = (relevance_mode or cfg.RELEVANCE_MODE).lower()
+    if mode not in RELEVANCE_MODES:
+        logger.warning(f"Unknown relevance mode '{mode}', using '{cfg.RELEVANCE_MODE}'")
+        mode = cfg.RELEVANCE_MODE
+    return mode
@@ -1,39 +1,206 @@
 import json
 import uuid
+import re
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import google.generativeai as genai
 from sentence_transformers import SentenceTransformer
+from tenacity import retry, wait_exponential_jitter, stop_after_attempt
+import tiktoken
 import os
 from embedding_model import MultiModalEmbedder
+from rate_limiter import gemini_limiter, CHARS_PER_TOKEN
+import config as cfg
+from logging_Setup import get_logger
 
 
 load_dotenv()
+logger = get_logger(__name__)
+
+SUMMARY_MODEL_NAME = "gemini-2.0-flash"
+# Bump when the prompts or chunking change, older cached summaries are then ignored
+SUMMARY_CACHE_VERSION = 2
+MAX_REDUCE_ROUNDS = 3
+# Gemini's tokenizer is only reachable through a count_tokens API call per piece, cl100k_base
+# is a local stand-in that tracks it far better than characters on code, tables and CJK text
+TOKEN_ENCODING = "cl100k_base"
+
+# Map calls of every summary share one bounded pool (the Gemini limiter still applies)
+_map_pool = ThreadPoolExecutor(max_workers=cfg.SUMMARY_MAP_WORKERS, thread_name_prefix="summary-map")
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """tiktoken encoding, or None when it can't be loaded (its BPE file is downloaded on first use)"""
+    global _encoding
+    with _encoding_lock:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable, estimating tokens from characters: {e}")
+                _encoding = False
+        return _encoding or None
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_for_summary(text, max_tokens):
+    """
+    Split text into pieces of at most ~max_tokens tokens, breaking on paragraph,
+    then sentence, then word boundaries so no piece starts mid-sentence if avoidable.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    units = []  # (text, tokens)
+    for paragraph in re.split(r"\n\s*\n", text):
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            units.append((paragraph, tokens))
+            continue
+        for sentence in re.split(r"(?<=[.!?])\s+", paragraph):
+            tokens = count_tokens(sentence)
+            while tokens > max_tokens:
+                # No boundary at all, cut at the last space before the proportional length
+                limit = max(1, len(sentence) * max_tokens // tokens)
+                cut = sentence.rfind(" ", 0, limit)
+                cut = cut if cut > 0 else limit
+                units.append((sentence[:cut], count_tokens(sentence[:cut])))
+                sentence = sentence[cut:].lstrip()
+                tokens = count_tokens(sentence)
+            units.append((sentence, tokens))
+
+    pieces, current, current_tokens = [], "", 0
+    for unit, tokens in units:
+        if current and current_tokens + tokens + 1 > max_tokens:
+            pieces.append(current)
+            current, current_tokens = "", 0
+        current = f"{current}\n\n{unit}" if current else unit
+        current_tokens += tokens + 1
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class SummaryCancelled(Exception):
+    """The caller no longer needs the summary"""
 
 
 class Summarizer:
-    def __init__(self):
+    def __init__(self, cache_dir=cfg.SUMMARY_CACHE_DIR):
         self.embedder = MultiModalEmbedder()
         genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-        self.gemini_model = genai.GenerativeModel("gemini-2.0-flash")
-
-    def generate_summary(self, text, chunk_size=500000):
-        chunks = [text[i:i+chunk_size]
-                  for i in range(0, len(text), chunk_size)]
-        summaries = []
-        i=0
-        for chunk in chunks:
-            response = self.gemini_model.generate_content(
-                f"Summarize this content briefly:\n{chunk}")
-            print("this is round",i)
-            i+=1
-            
-            summaries.append(response.text)
-        return "\n".join(summaries)
+        self.gemini_model = genai.GenerativeModel(SUMMARY_MODEL_NAME)
+        self.cache_dir = cache_dir
+
+    @retry(wait=wait_exponential_jitter(initial=2, max=60),
+           stop=stop_after_attempt(5),
+           reraise=True)
+    def _generate(self, prompt):
+        with gemini_limiter.limit(prompt):
+            return self.gemini_model.generate_content(prompt).text
+
+    def _cache_path(self, content_hash):
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}.json")
+
+    def _load_cached(self, content_hash):
+        try:
+            with open(self._cache_path(content_hash), "r") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cached.get("version") != SUMMARY_CACHE_VERSION or cached.get("model") != SUMMARY_MODEL_NAME:
+            return None
+        return cached.get("summary")
+
+    def _save_cached(self, content_hash, summary):
+        path = self._cache_path(content_hash)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"version": SUMMARY_CACHE_VERSION, "model": SUMMARY_MODEL_NAME, "summary": summary}, f)
+        os.replace(tmp_path, path)
+
+    def generate_summary(self, text, chunk_tokens=None, content_hash=None, cancel_event=None):
+        """
+        Map-reduce summary of text. Pieces of at most chunk_tokens are summarized
+        concurrently, then the partial summaries are merged into one short summary.
+
+        Args:
+            text (str): Text to summarize
+            chunk_tokens (int): Max tokens per map call, defaults to cfg.SUMMARY_MAP_CHUNK_TOKENS
+            content_hash (str): Cache key, normally the SHA-256 of the source file, so text
+                must only depend on the file's content. Defaults to a hash of the text itself.
+            cancel_event (threading.Event): When set, no further Gemini calls are made
+                and SummaryCancelled is raised, nothing is cached
+
+        Returns:
+            str: The summary
+        """
+        chunk_tokens = chunk_tokens or cfg.SUMMARY_MAP_CHUNK_TOKENS
+        cache_key = content_hash or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        cached = self._load_cached(cache_key)
+        if cached is not None:
+            logger.info(f"Using cached summary for {cache_key}")
+            return cached
+
+        def generate(prompt):
+            if cancel_event is not None and cancel_event.is_set():
+                raise SummaryCancelled(f"Summary of {cache_key} cancelled")
+            return self._generate(prompt)
+
+        chunks = split_for_summary(text, chunk_tokens)
+        if len(chunks) == 1:
+            summary = generate(
+                f"Summarize this content briefly, in at most {cfg.SUMMARY_MAX_WORDS} words:\n{chunks[0]}")
+        else:
+            logger.info(f"Summarizing {len(chunks)} pieces concurrently")
+            partials = list(_map_pool.map(
+                generate,
+                [f"This is part {i + 1} of {len(chunks)} of a document. "
+                 f"Summarize this part briefly, keeping names, numbers and key facts:\n{chunk}"
+                 for i, chunk in enumerate(chunks)]))
+            summary = self._reduce(partials, chunk_tokens, generate)
+
+        if cancel_event is not None and cancel_event.is_set():
+            raise SummaryCancelled(f"Summary of {cache_key} cancelled")
+        self._save_cached(cache_key, summary)
+        return summary
+
+    def _reduce(self, partials, chunk_tokens, generate):
+        """Merge partial summaries, in several rounds if they don't fit one call"""
+        groups = split_for_summary("\n\n".join(partials), chunk_tokens)
+        for _ in range(MAX_REDUCE_ROUNDS):
+            if len(groups) == 1:
+                break
+            partials = list(_map_pool.map(
+                generate,
+                [f"Merge these partial summaries into one shorter summary:\n{group}" for group in groups]))
+            groups = split_for_summary("\n\n".join(partials), chunk_tokens)
+        # Still too long after the last round, keep what fits one call
+        merged = groups[0] if len(groups) == 1 else "\n\n".join(groups)[:chunk_tokens * CHARS_PER_TOKEN]
+        return generate(
+            "Combine these partial summaries of one document into a single coherent summary "
+            f"of at most {cfg.SUMMARY_MAX_WORDS} words, without repeating yourself:\n{merged}")
 
     def generate_embeddings(self, text):
         """Use only local embeddings for all text types"""
         return self.embedder.get_text_embedding(text)
 
+    def generate_embeddings_batch(self, texts):
+        """Embed many texts in one batched call, returns a NumPy matrix"""
+        return self.embedder.get_text_embeddings(texts)
+
 
 if __name__ == "__main__":
     summarizer = Summarizer()
@@ -52,4 +219,4 @@ if __name__ == "__main__":
     full_text = " ".join(data["text"].values()) + \
         "\n\nMetadata:\n" + "\n".join(metadata_lines)
     summary = summarizer.generate_summary(full_text)
-    print(summary) 
\ No newline at end of file
+    print(summary)
@@ -44,7 +44,7 @@ class TXT_Extractor:
             }
             json_path = os.path.join(self.output_dir, "extracted_data.json")
             with open(json_path, "w") as f:
-                json.dump(data, f, indent=4)
+                json.dump(data, f)
             return data
 
         except UnicodeDecodeError:
@@ -67,7 +67,7 @@ class TXT_Extractor:
             }
             json_path = os.path.join(self.output_dir, "extracted_data.json")
             with open(json_path, "w") as f:
-                json.dump(data, f, indent=4)
+                json.dump(data, f)
             return content if raw else data
 
     def extract_text(self):
@@ -1,6 +1,8 @@
 
 import shutil
 import os
+import threading
+import time
 
 def remove_files(output_path):
     if os.path.exists(output_path):
@@ -15,3 +17,28 @@ def remove_files(output_path):
             print(f"Error cleaning up output: {cleanup_error}")
     else:
         print(f"Output path does not exist: {output_path}")
+
+
+class StageTimer:
+    """Wall-clock seconds per named pipeline stage, safe to share between threads"""
+
+    def __init__(self):
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def run(self, stage, fn, *args, **kwargs):
+        """Call fn(*args, **kwargs) and record how long it took under `stage`"""
+        start_time = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            with self._lock:
+                self.timings[stage] = self.timings.get(stage, 0.0) + elapsed
+
+    def as_dict(self):
+        with self._lock:
+            return {stage: round(seconds, 3) for stage, seconds in self.timings.items()}
+
+    def summary(self):
+        return ", ".join(f"{stage}={seconds:.2f}s" for stage, seconds in self.as_dict().items())
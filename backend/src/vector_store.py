@@ -2,37 +2,100 @@ import chromadb
 from chromadb.config import Settings
 import logging
 import os
+import threading
 from embedding_model import MultiModalEmbedder
 import config as cfg
 from sumarizer import Summarizer
+from lexical_index import get_lexical_index, reciprocal_rank_fusion
 logger = logging.getLogger(__name__)
 
 CHROMA_DATA_DIR = cfg.CHROMA_DATA_DIR  # Ensure this is correctly imported
 
+
+class BulkInsertError(Exception):
+    """Raised when a bulk add fails, carries the per-batch failures"""
+    def __init__(self, message, failed_batches=None, rolled_back_ids=None):
+        self.failed_batches = failed_batches or []
+        self.rolled_back_ids = rolled_back_ids or []
+        super().__init__(message)
+
+
+# One Chroma client and collection handle per process, shared by every VectorStore()
+_chroma_lock = threading.Lock()
+_chroma_client = None
+_chroma_collections = {}
+
+
+def get_chroma_collections():
+    """
+    Open the persistent Chroma store once per process and return the shared
+    (client, text_collection, image_collection). Safe to call from Flask's threaded server.
+    """
+    global _chroma_client
+    if _chroma_client is not None:
+        return _chroma_client, _chroma_collections["text"], _chroma_collections["image"]
+
+    opened = False
+    with _chroma_lock:
+        # Another thread may have opened the store while we were waiting
+        if _chroma_client is None:
+            # Create persistent storage directory
+            os.makedirs(CHROMA_DATA_DIR, exist_ok=True)
+
+            # Configure client with persistent settings
+            client = chromadb.Client(Settings(
+                persist_directory=CHROMA_DATA_DIR,
+                is_persistent=True
+            ))
+
+            # Create separate collections
+            _chroma_collections["text"] = client.get_or_create_collection(
+                name="text_documents",
+                metadata={"hnsw:space": "cosine"}
+            )
+            _chroma_collections["image"] = client.get_or_create_collection(
+                name="image_documents",
+                metadata={"hnsw:space": "cosine"}
+            )
+            _chroma_client = client
+            opened = True
+            logger.info(f"Opened persistent Chroma store at {CHROMA_DATA_DIR}")
+
+    if opened:
+        # Reading every row can take a while on large stores, don't hold up the first request
+        threading.Thread(target=_backfill_lexical_indexes, name="bm25-backfill", daemon=True).start()
+
+    return _chroma_client, _chroma_collections["text"], _chroma_collections["image"]
+
+
+def _backfill_lexical_indexes():
+    """Index rows stored before the BM25 index existed (or whose indexing failed)"""
+    for collection_type in ("text", "image"):
+        try:
+            collection = _chroma_collections[collection_type]
+            index = get_lexical_index(collection_type)
+            missing = index.missing(collection.get(include=[])["ids"])
+            if not missing:
+                continue
+            rows = collection.get(ids=missing, include=["documents", "metadatas"])
+            index.add(rows["ids"], rows["documents"], rows["metadatas"])
+            # Rows deleted while we were reading must not linger in the index
+            still_stored = set(collection.get(ids=rows["ids"], include=[])["ids"])
+            index.remove([doc_id for doc_id in rows["ids"] if doc_id not in still_stored])
+            index.store.compact()
+            logger.info(f"Backfilled BM25 index of the {collection_type} collection with {len(rows['ids'])} rows")
+        except Exception as e:
+            logger.error(f"BM25 backfill of the {collection_type} collection failed: {str(e)}")
+
+
 class VectorStore:
     def __init__(self):
         # Initialize embedder
         self.embedder = MultiModalEmbedder()
 
-        # Create persistent storage directory
+        # Reuse the process-wide client and collections
         self.persist_dir = CHROMA_DATA_DIR
-        os.makedirs(self.persist_dir, exist_ok=True)
-
-        # Configure client with persistent settings
-        self.client = chromadb.Client(Settings(
-            persist_directory=self.persist_dir,
-            is_persistent=True
-        ))
-
-        # Create separate collections
-        self.text_collection = self.client.get_or_create_collection(
-            name="text_documents",
-            metadata={"hnsw:space": "cosine"}
-        )
-        self.image_collection = self.client.get_or_create_collection(
-            name="image_documents",
-            metadata={"hnsw:space": "cosine"}
-        )
+        self.client, self.text_collection, self.image_collection = get_chroma_collections()
 
     def add_text_embedding(self, doc_id, embedding, text, metadata):
         """Store with text content and metadata"""
@@ -46,6 +109,8 @@ class VectorStore:
             # self.client.persist()  # Explicitly save changes
         except Exception as e:
             logger.error(f"Error adding embedding: {str(e)}")
+            return
+        self._index_lexical("text", [doc_id], [text], [metadata])
 
     def add_image_embedding(self, doc_id, embedding, text, metadata):
         try:
@@ -57,6 +122,8 @@ class VectorStore:
             )
         except Exception as e:
             logger.error(f"Error adding embedding: {str(e)}")
+            return
+        self._index_lexical("image", [doc_id], [text], [metadata])
 
     def add_embedding(self, doc_id, embedding, text, metadata):
         """Store with text content and metadata"""
@@ -70,6 +137,106 @@ class VectorStore:
             # self.client.persist()  # Explicitly save changes
         except Exception as e:
             logger.error(f"Error adding embedding: {str(e)}")
+            return
+        self._index_lexical("text", [doc_id], [text], [metadata])
+
+    def add_text_embeddings(self, doc_ids, embeddings, texts, metadatas):
+        """Store many text chunks in bulk, embeddings can be a NumPy matrix"""
+        return self.add_many(doc_ids, embeddings, texts, metadatas, collection_type="text")
+
+    def add_many(self, ids, embeddings, documents, metadatas, collection_type="text", batch_size=None):
+        """
+        Bulk insert into a collection in batches of `batch_size` rows.
+        If any batch fails, the IDs already written by this call are deleted again
+        so the document is never left half-ingested.
+
+        Args:
+            ids (list[str]): Row IDs
+            embeddings (list | np.ndarray): One embedding per row
+            documents (list[str]): Text stored with each row
+            metadatas (list[dict]): Metadata stored with each row
+            collection_type (str): Either "text" or "image"
+            batch_size (int): Rows per collection.add, defaults to cfg.CHROMA_ADD_BATCH_SIZE
+
+        Returns:
+            dict: Summary with the number of rows written and batches used
+
+        Raises:
+            ValueError: If the input lists differ in length
+            BulkInsertError: If a batch failed, after rolling back the written IDs
+        """
+        collection = self.text_collection if collection_type == "text" else self.image_collection
+        batch_size = batch_size or cfg.CHROMA_ADD_BATCH_SIZE
+
+        if hasattr(embeddings, "tolist"):
+            embeddings = embeddings.tolist()
+        ids, documents, metadatas = list(ids), list(documents), list(metadatas)
+        if not (len(ids) == len(embeddings) == len(documents) == len(metadatas)):
+            raise ValueError(
+                f"add_many length mismatch: ids={len(ids)}, embeddings={len(embeddings)}, "
+                f"documents={len(documents)}, metadatas={len(metadatas)}")
+
+        total_batches = (len(ids) + batch_size - 1) // batch_size
+        written_ids = []
+        for batch_num, start in enumerate(range(0, len(ids), batch_size), start=1):
+            end = start + batch_size
+            batch_ids = ids[start:end]
+            try:
+                collection.add(
+                    ids=batch_ids,
+                    embeddings=embeddings[start:end],
+                    documents=documents[start:end],
+                    metadatas=metadatas[start:end]
+                )
+                written_ids.extend(batch_ids)
+            except Exception as e:
+                failure = {
+                    "batch": batch_num,
+                    "total_batches": total_batches,
+                    "first_id": batch_ids[0],
+                    "size": len(batch_ids),
+                    "error": str(e)
+                }
+                logger.error(f"Bulk add to {collection_type} collection failed at batch "
+                             f"{batch_num}/{total_batches}: {str(e)}")
+                rolled_back = self._rollback_ids(collection, written_ids)
+                raise BulkInsertError(
+                    f"Bulk add failed at batch {batch_num}/{total_batches}",
+                    failed_batches=[failure],
+                    rolled_back_ids=written_ids if rolled_back else []
+                ) from e
+
+        logger.info(f"Added {len(written_ids)} rows to {collection_type} collection in {total_batches} batch(es)")
+        self._index_lexical(collection_type, ids, documents, metadatas)
+        return {"written": len(written_ids), "batches": total_batches}
+
+    def _index_lexical(self, collection_type, ids, documents, metadatas):
+        """
+        Mirror added rows into the collection's BM25 index. A failure here only costs
+        keyword recall, so it is logged instead of failing the ingestion.
+        """
+        try:
+            get_lexical_index(collection_type).add(ids, documents, metadatas)
+        except Exception as e:
+            logger.error(f"BM25 indexing of {len(ids)} {collection_type} rows failed: {str(e)}")
+
+    def _unindex_lexical(self, collection_type, ids):
+        try:
+            get_lexical_index(collection_type).remove(ids)
+        except Exception as e:
+            logger.error(f"Removing {len(ids)} {collection_type} rows from the BM25 index failed: {str(e)}")
+
+    def _rollback_ids(self, collection, ids):
+        """Delete IDs written by a failed bulk add, returns True on success"""
+        if not ids:
+            return True
+        try:
+            collection.delete(ids=ids)
+            logger.warning(f"Rolled back {len(ids)} rows after failed bulk add")
+            return True
+        except Exception as e:
+            logger.error(f"Rollback of {len(ids)} rows failed: {str(e)}")
+            return False
 
     def query(self, query_embedding, n_results=5):
 
@@ -177,6 +344,46 @@ class VectorStore:
             print(f"Error in filtered query: {str(e)}")
             return []
     
+    def hybrid_query(self, query_text, query_embedding, collection_type="text", workspace_name=None,
+                     n_results=5, candidates=None):
+        """
+        Dense search and BM25 keyword search over one collection, fused with
+        reciprocal rank fusion so exact tokens (invoice numbers, keys, model names)
+        are found even when their embedding is not close to the question's.
+
+        Args:
+            query_text (str): The question, for the BM25 side
+            query_embedding (list): Its embedding, for the dense side
+            collection_type (str): Either "text" or "image"
+            workspace_name (str): Only search this workspace when given
+            n_results (int): IDs returned
+            candidates (int): Hits taken from each retriever before fusion, defaults to cfg.HYBRID_CANDIDATES
+
+        Returns:
+            list[str]: Doc IDs, best first
+        """
+        collection = self.text_collection if collection_type == "text" else self.image_collection
+        candidates = max(n_results, candidates or cfg.HYBRID_CANDIDATES)
+
+        query_params = {"query_embeddings": [query_embedding], "n_results": candidates}
+        if workspace_name:
+            query_params["where"] = {"workspace_name": workspace_name}
+        try:
+            results = collection.query(**query_params)
+            dense_ids = results["ids"][0] if results["ids"] else []
+        except Exception as e:
+            logger.error(f"Dense search failed, using BM25 results only: {str(e)}")
+            dense_ids = []
+
+        try:
+            lexical_ids = [doc_id for doc_id, _ in get_lexical_index(collection_type).search(
+                query_text, workspace_name=workspace_name, n_results=candidates)]
+        except Exception as e:
+            logger.error(f"BM25 search failed, using dense results only: {str(e)}")
+            lexical_ids = []
+
+        return reciprocal_rank_fusion([dense_ids, lexical_ids])[:n_results]
+
     def delete_from_text_collection(self, doc_id):
         """Delete document(s) from text collection"""
         # Ensure doc_id is a list
@@ -188,6 +395,7 @@ class VectorStore:
             print(f"Successfully deleted IDs: {existing_ids} from vector")
         else:
             print(f"No matching IDs found: {ids}")
+        self._unindex_lexical("text", ids)
 
     def delete_from_image_collection(self, doc_id):
         """Delete document(s) from image collection"""
@@ -200,6 +408,7 @@ class VectorStore:
             print(f"Successfully deleted IDs: {existing_ids} from image vector")
         else:
             print(f"No matching IDs found: {ids}")
+        self._unindex_lexical("image", ids)
 
     # Get the document content and metadata by ID(doc_id)
     def get_document_by_id(self, doc_id, collection_type="text"):
@@ -1,5 +1,6 @@
 import os
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from docx import Document
 from docx.opc.constants import RELATIONSHIP_TYPE as RT
 import pandas as pd
@@ -9,6 +10,7 @@ import io
 import json_functions as JC
 from qa_chain import QAChain
 import config as cfg
+from util import StageTimer
 
 OUTPUT_DIR = cfg.OUTPUT_DIR
 
@@ -24,15 +26,23 @@ class WordExtractor:
         os.makedirs(self.images_dir, exist_ok=True)
 
     def extract_text(self):
+        text = self._extract_paragraph_text()
+        self.classify_document(text)
+        return text
+
+    def _extract_paragraph_text(self):
         text = {}
         for i, para in enumerate(self.document.paragraphs):
             text[f"paragraph_{i+1}"] = para.text
+        return text
 
+    def classify_document(self, text):
+        """Ask Gemini for the document type from the start of the text"""
         qa_chain = QAChain()
         content_to_ask = str(text) if len(
             str(text)) < 2000 else str(text)[:2000]
         self.doc_type = qa_chain.give_document_type(content_to_ask)
-        return text
+        return self.doc_type
 
     def extract_tables(self):
         tables = {}
@@ -95,30 +105,43 @@ class WordExtractor:
             "document_type": self.doc_type
         }
 
-    def extract_all(self, extract_tables=True):
+    def extract_all(self, extract_tables=True, timer=None):
+        """
+        Run the extraction stages, with the Gemini document-type call overlapping
+        table and image extraction. Stage durations are recorded on `timer`.
+
+        Returns:
+            tuple: (data, json_path), the extraction and where it was persisted
+        """
+        timer = timer or StageTimer()
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="docx-stage") as stages:
+            text = timer.run("text", self._extract_paragraph_text)
+            doc_type_future = stages.submit(timer.run, "document_type", self.classify_document, text)
+
+            # Only extract tables if requested
+            tables = timer.run("tables", self.extract_tables) if extract_tables else {}
+            # Always extract images
+            images = timer.run("images", self.extract_images)
+            doc_type_future.result()
+
         data = {
-            "text": self.extract_text(),
-            "metadata": self.extract_metadata()
+            "text": text,
+            "metadata": self.extract_metadata(),
+            "tables": tables,
+            "images": images
         }
-        
-        # Only extract tables if requested
-        if extract_tables:
-            data["tables"] = self.extract_tables()
-        else:
-            data["tables"] = {}  # Empty tables dictionary
-            
-        # Always extract images
-        data["images"] = self.extract_images()
 
         # Save to JSON
         json_path = os.path.join(self.output_dir, "extracted_data.json")
-        with open(json_path, "w") as f:
-            json.dump(data, f, indent=4)
-        return json_path
 
+        def save():
+            with open(json_path, "w") as f:
+                json.dump(data, f)
+        timer.run("persist", save)
+        return data, json_path
 
 if __name__ == "__main__":
     docx_path = r"C:\Users\rajsu\OneDrive\Documents\amity_projects_sem4\software_design\assignment 1\Assignment_PriceScope.docx"
     extractor = WordExtractor(docx_path)
-    result_path = extractor.extract_all()
+    data, result_path = extractor.extract_all()
     print(f"Extraction complete. Results saved to: {result_path}")
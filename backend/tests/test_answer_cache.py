@@ -0,0 +1,48 @@
+import pytest
+
+from answer_cache import AnswerCache
+from metadata_store import MetadataStore
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Two caches on the same generations file, each with its own store like separate processes"""
+    path = str(tmp_path / "generations.json")
+    caches = []
+    for _ in range(2):
+        cache = AnswerCache(max_entries=10, ttl_sec=60, similarity_threshold=0.9, generations_file=path)
+        cache._generations = MetadataStore(path)
+        caches.append(cache)
+    return caches
+
+
+def test_hit_for_similar_question(workers):
+    cache, _ = workers
+    cache.put([1.0, 0.0], "ws", "text", {"answer": "42"})
+
+    assert cache.lookup([0.99, 0.05], "ws", "text") == {"answer": "42"}
+    assert cache.lookup([0.0, 1.0], "ws", "text") is None
+    assert cache.lookup([1.0, 0.0], "other", "text") is None
+
+
+def test_invalidation_in_another_worker_drops_entries(workers):
+    serving, uploading = workers
+    serving.put([1.0, 0.0], "ws", "text", {"answer": "old"})
+    serving.put([1.0, 0.0], None, "text", {"answer": "old, all workspaces"})
+    serving.put([1.0, 0.0], "other", "text", {"answer": "untouched"})
+
+    uploading.invalidate_workspace("ws")
+
+    assert serving.lookup([1.0, 0.0], "ws", "text") is None
+    assert serving.lookup([1.0, 0.0], None, "text") is None
+    assert serving.lookup([1.0, 0.0], "other", "text") == {"answer": "untouched"}
+
+
+def test_answer_computed_across_an_invalidation_is_not_stored(workers):
+    serving, uploading = workers
+    generation = serving.generation("ws")
+
+    uploading.invalidate_workspace("ws")
+    serving.put([1.0, 0.0], "ws", "text", {"answer": "stale"}, generation)
+
+    assert serving.lookup([1.0, 0.0], "ws", "text") is None
@@ -0,0 +1,73 @@
+import signal
+import sys
+import types
+
+import pytest
+
+# chunker only needs model_registry for its default, the tests pass their own registry
+sys.modules.setdefault("embedding_model", types.SimpleNamespace(model_registry=None))
+
+from chunker import TextChunker  # noqa: E402
+
+
+class CharTokenizer:
+    """One token per non-space character, like CJK text or a base64 blob"""
+    def __call__(self, texts, add_special_tokens=False):
+        return {"input_ids": [[0] * sum(not ch.isspace() for ch in text) for text in texts]}
+
+
+class FakeRegistry:
+    def __init__(self, max_seq_length=64):
+        self.model = types.SimpleNamespace(max_seq_length=max_seq_length, tokenizer=CharTokenizer())
+
+    def get_text_model(self):
+        return self.model
+
+
+class Hung(BaseException):
+    """Not an Exception, so count_tokens' tokenizer fallback can't swallow it"""
+
+
+@pytest.fixture
+def deadline():
+    """Fail instead of hanging if splitting never returns"""
+    def timeout(signum, frame):
+        raise Hung("split_text did not return")
+    previous = signal.signal(signal.SIGALRM, timeout)
+    signal.alarm(10)
+    yield
+    signal.alarm(0)
+    signal.signal(signal.SIGALRM, previous)
+
+
+def test_dense_run_without_whitespace_terminates(deadline):
+    chunker = TextChunker(registry=FakeRegistry(), overlap_tokens=8)
+    text = "漢" * 2000
+
+    chunks = chunker.split_text(text)
+
+    assert all(chunk["tokens"] <= chunker.max_tokens for chunk in chunks)
+    assert "".join(chunk["text"] for chunk in chunks) == text
+
+
+def test_dense_run_between_words(deadline):
+    chunker = TextChunker(registry=FakeRegistry(), overlap_tokens=0)
+    text = "key: " + "QUJD" * 300 + " end of file."
+
+    chunks = chunker.split_text(text)
+
+    assert all(chunk["tokens"] <= chunker.max_tokens for chunk in chunks)
+    assert chunks[0]["text"].startswith("key:")
+    assert chunks[-1]["text"].endswith("end of file.")
+
+
+def test_sentences_are_kept_whole():
+    chunker = TextChunker(registry=FakeRegistry(), overlap_tokens=0)
+    sentences = [f"Sentence number {i} is here." for i in range(20)]
+
+    chunks = chunker.split_text(" ".join(sentences))
+
+    assert len(chunks) > 1
+    assert all(chunk["tokens"] <= chunker.max_tokens for chunk in chunks)
+    for chunk in chunks:
+        assert chunk["text"].startswith("Sentence") and chunk["text"].endswith(".")
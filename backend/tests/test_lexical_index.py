@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+from lexical_index import BM25Index
+from metadata_store import MetadataStore
+
+
+@pytest.fixture
+def index_path(tmp_path):
+    return str(tmp_path / "text_index.json")
+
+
+def open_index(path, **options):
+    """An index with its own store, like the same file opened by another process"""
+    index = BM25Index(path)
+    index.store = MetadataStore(path, compact_bytes=options.get("compact_bytes", 1 << 20))
+    index.reloads = 0
+    reload = index._reload
+
+    def counting_reload():
+        index.reloads += 1
+        reload()
+    index._reload = counting_reload
+    return index
+
+
+def add(index, doc_id, text, workspace_name="ws"):
+    index.add([doc_id], [text], [{"workspace_name": workspace_name}])
+
+
+def test_foreign_writes_are_applied_without_reload(index_path):
+    ours, theirs = open_index(index_path), open_index(index_path)
+    add(ours, "a", "invoice INV-2024-0042 total")
+    assert [doc_id for doc_id, _ in theirs.search("INV-2024-0042")] == ["a"]
+
+    add(ours, "b", "shipping address for INV-2024-0099")
+    ours.remove(["a"])
+    add(theirs, "c", "meeting notes")
+
+    assert [doc_id for doc_id, _ in theirs.search("INV-2024-0099")] == ["b"]
+    assert theirs.search("0042") == []
+    assert [doc_id for doc_id, _ in ours.search("meeting")] == ["c"]
+    assert len(ours) == len(theirs) == 2
+    # Only the initial load, everything after came from the log
+    assert ours.reloads == theirs.reloads == 1
+
+
+def test_compaction_by_another_process_triggers_one_reload(index_path):
+    ours, theirs = open_index(index_path, compact_bytes=200), open_index(index_path, compact_bytes=200)
+    add(ours, "a", "alpha")
+    assert len(theirs) == 1
+
+    for idx in range(5):
+        add(ours, f"doc-{idx}", f"bulk text number {idx} " * 5)
+
+    assert len(theirs) == 6
+    assert theirs.reloads == 2
+    with open(index_path) as f:
+        snapshot = f.read()
+    assert "\n" not in snapshot and ": " not in snapshot
+    assert set(json.loads(snapshot)) <= {"a"} | {f"doc-{idx}" for idx in range(5)}
+
+
+def test_store_compacts_only_past_its_byte_threshold(index_path):
+    store = MetadataStore(index_path, compact_bytes=1 << 20)
+    for idx in range(2000):
+        store.set(f"key-{idx}", {"tf": {"term": idx}})
+
+    assert store._log_entries == 2000
+    assert store.changes_since(store.version()) == ([], store.version())
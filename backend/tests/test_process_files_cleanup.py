@@ -0,0 +1,169 @@
+import importlib
+import sys
+import types
+
+import pytest
+
+import config as cfg
+
+
+class BulkInsertError(Exception):
+    pass
+
+
+class Backend:
+    """In-memory stand-ins for MySQL, Chroma, the content store and docs_metadata"""
+    def __init__(self):
+        self.documents = {}
+        self.vectors = {}
+        self.content_refs = {"abc": 1}
+        self.metadata = {}
+        self.fail_at = None
+        self.upload = None
+
+
+@pytest.fixture
+def backend(monkeypatch, tmp_path):
+    state = Backend()
+
+    class FakeDatabase:
+        def __init__(self):
+            self.conn = types.SimpleNamespace(close=lambda: None)
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def insert_document(self, doc_id, title, workspace_name, timestamp, content_path):
+            state.documents[doc_id] = content_path
+
+        def delete_doc(self, doc_id):
+            return state.documents.pop(doc_id, None) is not None
+
+    class FakeVectorStore:
+        def add_text_embeddings(self, doc_ids, embeddings, texts, metadatas):
+            if state.fail_at == "index":
+                # add_many rolls back its own batches before raising
+                raise BulkInsertError("Bulk add failed at batch 1/1")
+            state.vectors.update(dict(zip(doc_ids, texts)))
+
+        def delete_from_text_collection(self, doc_id):
+            for single_id in doc_id if isinstance(doc_id, list) else [doc_id]:
+                state.vectors.pop(single_id, None)
+
+    class FakeContentStore:
+        def acquire(self, content_hash):
+            state.content_refs[content_hash] += 1
+            return {"content_hash": content_hash, "data": extracted_data(),
+                    "chunk_texts": ["stale chunking"], "embeddings": None}
+
+        def save(self, content_hash, ext, data, chunk_texts, embeddings, data_path=None, take_ref=True):
+            if take_ref:
+                state.content_refs[content_hash] += 1
+
+        def release(self, content_hash):
+            state.content_refs[content_hash] -= 1
+
+    class FakeMetadataStore:
+        def set(self, key, value):
+            state.metadata[key] = value
+
+        def pop(self, key, predicate=None):
+            value = state.metadata.get(key)
+            if value is None or (predicate is not None and not predicate(value)):
+                return None
+            return state.metadata.pop(key)
+
+    docs_metadata = FakeMetadataStore()
+
+    def update_metadata(file_name, metadata):
+        if state.fail_at == "metadata":
+            raise OSError("disk full")
+        docs_metadata.set(file_name, metadata)
+
+    class FakeExtractor:
+        def __init__(self, file_path, workspace):
+            self.output_dir = str(tmp_path)
+            self.images_dir = str(tmp_path)
+
+    class FakeChunker:
+        def split_text(self, text, markdown=False):
+            return [{"text": text, "start": 0, "end": len(text), "tokens": 1}]
+
+    fakes = {
+        "pdf_extractor": types.SimpleNamespace(PDFExtractor=FakeExtractor),
+        "word_doc_extractor": types.SimpleNamespace(WordExtractor=FakeExtractor),
+        "text_extractor": types.SimpleNamespace(TXT_Extractor=None),
+        "image_processor": types.SimpleNamespace(ImageProcessor=None),
+        "gemini_direct": types.SimpleNamespace(generate_image_title_dscrpt=None),
+        "sumarizer": types.SimpleNamespace(Summarizer=lambda: types.SimpleNamespace(
+            generate_embeddings_batch=lambda texts: [[0.0]] * len(texts))),
+        "database": types.SimpleNamespace(Database=FakeDatabase),
+        "vector_store": types.SimpleNamespace(VectorStore=FakeVectorStore, BulkInsertError=BulkInsertError),
+        "json_functions": types.SimpleNamespace(_update_DOCX_metadata_file=update_metadata),
+        "helper_functions": types.SimpleNamespace(
+            is_file_too_large=lambda *args: False, revert_fileAdded=lambda *args: None),
+        "answer_cache": types.SimpleNamespace(answer_cache=None),
+        "content_store": types.SimpleNamespace(
+            content_store=FakeContentStore(), file_sha256=lambda path: "abc"),
+        "chunker": types.SimpleNamespace(get_chunker=FakeChunker),
+        "metadata_store": types.SimpleNamespace(docs_metadata=docs_metadata),
+        "errorHandlers.fileManageErrorHandlers": types.SimpleNamespace(
+            FileSizeError=type("FileSizeError", (Exception,), {}),
+            FileTypeError=type("FileTypeError", (Exception,), {}),
+            FileAlreadyExistsError=type("FileAlreadyExistsError", (Exception,), {})),
+    }
+    for name, module in fakes.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "process_files", raising=False)
+    process_files = importlib.import_module("process_files")
+    monkeypatch.setattr(process_files, "pre_process_check", lambda *args: None)
+    monkeypatch.setattr(cfg, "CONTENT_DEDUP", True)
+    monkeypatch.setattr(cfg, "SUMMARIZE_DOCUMENTS", False)
+
+    upload = tmp_path / "report.pdf"
+    upload.write_bytes(b"%PDF-1.4")
+    state.upload = str(upload)
+
+    yield state, process_files
+    sys.modules.pop("process_files", None)
+
+
+def extracted_data():
+    return {
+        "metadata": {"title": "report.pdf", "timestamp": "2024-01-01", "source": "report.pdf",
+                     "document_type": "Invoice"},
+        "text": {"page_1": "Invoice INV-2024-0042", "page_2": "Total due 42 EUR"},
+        "tables": {},
+    }
+
+
+@pytest.mark.parametrize("fail_at", ["index", "metadata"])
+def test_failed_ingestion_leaves_nothing_behind(backend, fail_at):
+    state, process_files = backend
+    state.fail_at = fail_at
+    error_context = {}
+
+    result = process_files.process_files(state.upload, workspace_name="ws", error_context=error_context)
+
+    assert result is None
+    assert error_context["error_occurred"]
+    assert error_context["error_details"]["location"] == "process_files"
+    assert state.documents == {}
+    assert state.vectors == {}
+    assert state.metadata == {}
+    # Only the reference held by the other document using this content is left
+    assert state.content_refs == {"abc": 1}
+
+
+def test_successful_ingestion_keeps_its_artifacts(backend):
+    state, process_files = backend
+
+    doc_ids = process_files.process_files(state.upload, workspace_name="ws")
+
+    assert doc_ids and set(doc_ids) == set(state.vectors)
+    assert len(state.documents) == 1
+    assert "report.pdf" in state.metadata
+    assert state.content_refs == {"abc": 2}
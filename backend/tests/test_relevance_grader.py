@@ -0,0 +1,154 @@
+import contextlib
+import importlib
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+import config as cfg
+from relevance_grader import grade_contexts
+
+
+class FakeLLM:
+    """Stands in for the Gemini client, each context sets its own latency and answer"""
+    def __init__(self):
+        self.specs = {}  # context content -> {"latency", "answer", "error"}
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0
+        self.release = threading.Event()  # lets "hanging" calls finish when a test ends
+
+    def invoke(self, prompt):
+        spec = next(spec for content, spec in self.specs.items() if content in prompt)
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if spec["latency"] is None:
+                self.release.wait(5)
+            else:
+                time.sleep(spec["latency"])
+            if spec.get("error"):
+                raise RuntimeError("quota exceeded")
+            return spec["answer"]
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def contexts(self, *specs):
+        contexts = []
+        for spec in specs:
+            content = f"context {len(self.specs)} {time.monotonic_ns()}"
+            self.specs[content] = spec
+            contexts.append({"text": {"content": content}})
+        return contexts
+
+
+class NoLimit:
+    @contextlib.contextmanager
+    def limit(self, payload=None, tokens=None):
+        yield
+
+
+@pytest.fixture
+def llm():
+    llm = FakeLLM()
+    yield llm
+    llm.release.set()
+
+
+@pytest.fixture
+def qa(monkeypatch, llm):
+    """A real QAChain whose Gemini client is the fake LLM, without the shared limiter"""
+    def retry(*args, **kwargs):
+        return lambda func: func
+
+    langchain = types.ModuleType("langchain")
+    langchain.chains = types.SimpleNamespace(RetrievalQA=None)
+    fakes = {
+        "langchain": langchain,
+        "langchain.chains": langchain.chains,
+        "langchain_google_genai": types.SimpleNamespace(GoogleGenerativeAI=lambda **kwargs: llm),
+        "tenacity": types.SimpleNamespace(
+            retry=retry, wait_exponential_jitter=retry, stop_after_attempt=retry),
+        "PIL": types.SimpleNamespace(Image=None),
+        "dotenv": types.SimpleNamespace(load_dotenv=lambda *args, **kwargs: None),
+    }
+    for name, module in fakes.items():
+        monkeypatch.setitem(sys.modules, name, module)
+    monkeypatch.delitem(sys.modules, "qa_chain", raising=False)
+    qa_chain = importlib.import_module("qa_chain")
+    monkeypatch.setattr(qa_chain, "gemini_limiter", NoLimit())
+    yield qa_chain.QAChain()
+    sys.modules.pop("qa_chain", None)
+
+
+def test_scores_keep_input_order(qa, llm):
+    # Slowest first, so the graders finish in reverse order
+    contexts = llm.contexts(
+        {"latency": 0.3, "answer": "1"},
+        {"latency": 0.2, "answer": "0"},
+        {"latency": 0.1, "answer": " 1\n"},
+        {"latency": 0.0, "answer": "not a number"},
+    )
+
+    scores = grade_contexts(qa, contexts, "question", deadline_sec=5)
+
+    assert scores == [1.0, 0.0, 1.0, 0.0]
+
+
+def test_graders_run_concurrently(qa, llm):
+    contexts = llm.contexts(*[{"latency": 0.3, "answer": "1"} for _ in range(4)])
+
+    start_time = time.monotonic()
+    scores = grade_contexts(qa, contexts, "question", deadline_sec=5)
+    elapsed = time.monotonic() - start_time
+
+    assert scores == [1.0] * 4
+    assert llm.max_active > 1
+    assert elapsed < 0.3 * 4 * 0.75
+
+
+def test_late_graders_are_unknown_at_the_deadline(qa, llm):
+    contexts = llm.contexts(
+        {"latency": 0.0, "answer": "1"},
+        {"latency": None, "answer": "1"},  # hangs until released
+        {"latency": 0.0, "answer": "0"},
+    )
+
+    start_time = time.monotonic()
+    scores = grade_contexts(qa, contexts, "question", deadline_sec=0.3)
+    elapsed = time.monotonic() - start_time
+
+    assert scores == [1.0, None, 0.0]
+    assert elapsed < 1.0
+
+
+def test_busy_request_does_not_starve_others(monkeypatch, qa, llm):
+    monkeypatch.setattr(cfg, "RELEVANCE_MAX_WORKERS", 2)
+    hanging = llm.contexts(*[{"latency": None, "answer": "1"} for _ in range(6)])
+    busy = threading.Thread(target=grade_contexts, args=(qa, hanging, "question"), kwargs={"deadline_sec": 2})
+    busy.start()
+    time.sleep(0.1)  # the busy request holds all of its graders now
+
+    scores = grade_contexts(qa, llm.contexts({"latency": 0.0, "answer": "1"},
+                                             {"latency": 0.0, "answer": "0"}), "question", deadline_sec=1)
+
+    llm.release.set()
+    busy.join()
+    assert scores == [1.0, 0.0]
+
+
+def test_failed_grader_counts_as_irrelevant(qa, llm):
+    contexts = llm.contexts(
+        {"latency": 0.0, "answer": "1"},
+        {"latency": 0.0, "answer": "1", "error": True},
+    )
+
+    assert grade_contexts(qa, contexts, "question", deadline_sec=5) == [1.0, 0.0]
+
+
+def test_no_contexts(qa):
+    assert grade_contexts(qa, [], "question") == []
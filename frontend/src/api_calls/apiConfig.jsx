@@ -4,10 +4,12 @@ export const API_BASE_URL = VITE_BACKEND_URL || "http://127.0.0.1:5000";
 export const ENDPOINTS = {
     FILE_DOWNLOAD: "/files/download", 
     FILE_PROCESS: "/process_file/process",
+    FILE_PROCESS_JOB: "/process_file/jobs",
     IMAGE_DESCRIPTION_GENERATE: "/process_file/generate_image_description",
     FILE_UPLOAD: "/files/upload",
     LOGS_UPLOAD: "/logs",
     CHATPROCESS: "/chat/process",
+    CHATSTREAM: "/chat/stream",
     UPLOAD_FILE_ACCESS: `${API_BASE_URL}/fileAccess/files`,
     AUTH_LOGIN: `${API_BASE_URL}/auth/validate`,
   };
\ No newline at end of file
@@ -30,4 +30,69 @@ const processChatInput = async (inputData, questionType, workspace) => {
   }
 }
 
-export { processChatInput };
+const getSecretKey = () => {
+  const userData = JSON.parse(localStorage.getItem("userData"));
+  return userData?.value?.secret_key;
+};
+
+// Streams the answer from /chat/stream (Server-Sent Events over a POST, so fetch
+// instead of EventSource). onEvent(event, data) is called for every event:
+// "retrieval" (sources), "token" ({ text }), "done" or "error".
+const streamChatInput = async (inputData, questionType, workspace, onEvent) => {
+  const url = `${API_BASE_URL}${ENDPOINTS.CHATSTREAM}`;
+  const startTime = ApiLogger.logRequest(ENDPOINTS.CHATSTREAM, "POST", { inputData, questionType, workspace });
+
+  try {
+    const headers = { "Content-Type": "application/json" };
+    const secretKey = getSecretKey();
+    if (secretKey) {
+      headers["X-Secret-Key"] = secretKey;
+    }
+
+    const response = await fetch(url, {
+      method: "POST",
+      headers,
+      body: JSON.stringify({ inputData, questionType, workspace }),
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Chat stream failed with status ${response.status}`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let answer = "";
+
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      // Events are separated by a blank line
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = "message";
+        let data = "";
+        for (const line of rawEvent.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        }
+        const payload = data ? JSON.parse(data) : {};
+        if (event === "token") answer += payload.text;
+        if (event === "error") throw new Error(payload.message);
+        onEvent(event, payload);
+      }
+    }
+
+    ApiLogger.logResponse(ENDPOINTS.CHATSTREAM, response.status, { answer }, startTime);
+    return { success: true, data: { answer } };
+  } catch (error) {
+    ApiLogger.logError(ENDPOINTS.CHATSTREAM, error, startTime);
+    return { success: false, error: error.message };
+  }
+};
+
+export { processChatInput, streamChatInput };
@@ -72,7 +72,48 @@ async function uploadFileFromUrl(data) {
  * @returns {Promise} - Response from the API
  */
 async function processFile(data) {
-  return makeApiCall(ENDPOINTS.FILE_PROCESS, data, "POST");
+  const queued = await makeApiCall(ENDPOINTS.FILE_PROCESS, data, "POST");
+  if (!queued.success || queued.data.status !== "accepted") {
+    return queued;
+  }
+  return waitForProcessingJob(queued.data.data.job_id);
+}
+
+const JOB_POLL_INTERVAL_MS = 2000;
+// OCR and summaries of large files take minutes, anything past this is treated as stuck
+const JOB_MAX_WAIT_MS = 15 * 60 * 1000;
+
+/**
+ * Poll a queued processing job until it finishes or JOB_MAX_WAIT_MS passes
+ * @param {string} jobId - Job id returned by the process endpoint
+ * @returns {Promise} - Same shape as a synchronous processFile response
+ */
+async function waitForProcessingJob(jobId) {
+  const deadline = Date.now() + JOB_MAX_WAIT_MS;
+  while (Date.now() < deadline) {
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+    const job = await makeApiCall(`${ENDPOINTS.FILE_PROCESS_JOB}/${jobId}`, {}, "GET");
+    if (!job.success) {
+      return job;
+    }
+
+    const { job_status, result } = job.data.data;
+    if (job_status === "succeeded") {
+      return { success: true, data: result };
+    }
+    if (job_status === "failed") {
+      return { success: false, error: result };
+    }
+  }
+  return {
+    success: false,
+    error: {
+      status: "error",
+      message: `File processing did not finish within ${JOB_MAX_WAIT_MS / 60000} minutes, check again later`,
+      error_type: "processing_timeout",
+      job_id: jobId
+    }
+  };
 }
 
 /**
@@ -4,7 +4,7 @@ import UploadPopUp from "./UploadPopUp";
 import { SVGIcon } from "../../component/fileIcons";
 import workspaceAPI from "../../api_calls/workspaceManager";
 import { truncateFileName } from "../../services/fileService"; // Import the truncateFileName function
-import { processChatInput } from "../../api_calls/chatProcess"; // Import the processChatInput function
+import { processChatInput, streamChatInput } from "../../api_calls/chatProcess"; // Import the chat request functions
 import ReactMarkdown from "react-markdown";
 import MarkdownViewer from "../../utils/markdownViewer";
 import { ENDPOINTS } from "../../api_calls/apiConfig"; // Import the UPLOAD_FILE_ACCESS constant
@@ -120,27 +120,55 @@ function ChatPage() {
     setInputValue("");
     setIsTyping(true);
 
+    const aiMessageId = messages.length + 2;
+    let streamedText = "";
+
     try {
-      const response = await processChatInput(
+      // Stream the answer in as it is generated
+      const response = await streamChatInput(
         newMessage.content,
         toogleState,
-        activeWorkspace.name
+        activeWorkspace.name,
+        (event, data) => {
+          if (event !== "token") return;
+          const isFirstToken = streamedText === "";
+          streamedText += data.text;
+          const content = processResponseLinks(streamedText);
+          if (isFirstToken) {
+            setIsTyping(false);
+            setMessages((prev) => [...prev, { id: aiMessageId, content, isAI: true }]);
+          } else {
+            setMessages((prev) =>
+              prev.map((msg) => (msg.id === aiMessageId ? { ...msg, content } : msg))
+            );
+          }
+        }
       );
-      console.log("Raw response data:", JSON.stringify(response.data.answer)); 
-      if (response.success === false) {
-        console.error("Error processing chat input:", response.error);
-        setChatError("Error processing chat input. Please try again.");
-        setIsTyping(false);
-        return;
+
+      if (response.success === false && streamedText === "") {
+        // Nothing arrived, fall back to the non-streaming endpoint
+        console.warn("Chat stream failed, retrying without streaming:", response.error);
+        const fallback = await processChatInput(
+          newMessage.content,
+          toogleState,
+          activeWorkspace.name
+        );
+        if (fallback.success === false) {
+          console.error("Error processing chat input:", fallback.error);
+          setChatError("Error processing chat input. Please try again.");
+          setIsTyping(false);
+          return;
+        }
+        const aiResponse = {
+          id: aiMessageId,
+          content: processResponseLinks(fallback.data.answer),
+          isAI: true,
+        };
+        setMessages((prev) => [...prev, aiResponse]);
+      } else if (response.success === false) {
+        console.error("Chat stream interrupted:", response.error);
+        setChatError("The answer was interrupted. Please try again.");
       }
-      const processedContent = processResponseLinks(response.data.answer);
-      console.log("After processing:", processedContent);
-      const aiResponse = {
-        id: messages.length + 2,
-        content: processedContent,
-        isAI: true,
-      };
-      setMessages((prev) => [...prev, aiResponse]);
       setIsTyping(false);
     } catch (error) {
       console.error("Error processing chat input:", error);